@@ -2,36 +2,29 @@ import os
 import sys
 import time
 import argparse
+import json
 from dotenv import load_dotenv
-from ai_orchestrator.utils.airtable_exporter import export_all_tables_and_metadata
 from ai_orchestrator.utils.retry import try_agent_with_retry
-from ai_orchestrator.agents.travel.travel_agent import travel_agent
-from ai_orchestrator.agents.airtable_logger.airtable_logger_agent import airtable_logger_agent
-from ai_orchestrator.agents.summary.summarize_agent import summarize_agent
-from ai_orchestrator.agents.pm.pm_agent import pm_agent
-from ai_orchestrator.agents.pm_director.pm_director_agent import pm_director_agent
-from ai_orchestrator.agents.ideas.ideas_agent import ideas_agent
-from ai_orchestrator.agents.ai_dev.ai_dev_agent import ai_dev_agent
-from ai_orchestrator.agents.orchestrator.orchestrator_agent import orchestrator_agent
-from ai_orchestrator.agents.ai_dev.ai_infra_agent import ai_infra_agent
-from ai_orchestrator.agents.airtable_logger.airtable_logger import log_to_airtable
-from ai_orchestrator.agents.logging.agent_activity_logger import log_agent_activity
-from ai_orchestrator.agents.classifier_agent import classifier_agent
-
-try:
-    from colorama import Fore, Style, init as colorama_init
-    colorama_init(autoreset=True)
-    COLORAMA_AVAILABLE = True
-except ImportError:
-    COLORAMA_AVAILABLE = False
+from ai_orchestrator.utils.keyword_matcher import compile_routes, explain_route as explain_match
+from ai_orchestrator.utils.log_pipeline import build_activity_log
+from ai_orchestrator.utils.agent_registry import AgentSpec, build_routing
+
+# Agents, the Airtable clients, the exporter (pandas) and the classifier are imported
+# on first use, so a single --prompt (or the web interface) only loads what it runs
 
 REQUIRED_ENV_VARS = ["AIRTABLE_API_KEY", "AIRTABLE_BASE_ID", "OPENAI_API_KEY"]
 
 def validate_env():
+    try:
+        from colorama import Fore, init as colorama_init
+        colorama_init(autoreset=True)
+        colorama_available = True
+    except ImportError:
+        colorama_available = False
     missing = [k for k in REQUIRED_ENV_VARS if not os.getenv(k)]
     if missing:
         msg = f"Missing required environment variables: {', '.join(missing)}"
-        if COLORAMA_AVAILABLE:
+        if colorama_available:
             print(Fore.RED + "❌ " + msg)
         else:
             print("❌ " + msg)
@@ -39,71 +32,100 @@ def validate_env():
         print("Tip: Generate a .env.example template for your team!")
         sys.exit(1)
     else:
-        if COLORAMA_AVAILABLE:
+        if colorama_available:
             print(Fore.GREEN + "✅ All required environment variables are set!")
         else:
             print("✅ All required environment variables are set!")
 
 # === Routing Logic ===
-AGENT_ROUTING = {
-    "trip": travel_agent,
-    "log": airtable_logger_agent,
-    "summarize": summarize_agent,
-    "pm": pm_agent,
-    "director": pm_director_agent,
-    "idea": ideas_agent,
-    "infra": ai_infra_agent,
-    "developer": ai_dev_agent,
-    "orchestrate": orchestrator_agent,
-}
+# Built-in agents: name, routing keywords and import path (imported on first call).
+# Installed plugins add more through the "ai_orchestrator.agents" entry point group.
+BUILTIN_AGENTS = [
+    AgentSpec("travel_agent", ("trip",), "ai_orchestrator.agents.travel.travel_agent:travel_agent"),
+    AgentSpec("airtable_logger_agent", ("log",),
+              "ai_orchestrator.agents.airtable_logger.airtable_logger_agent:airtable_logger_agent"),
+    AgentSpec("summarize_agent", ("summarize",), "ai_orchestrator.agents.summary.summarize_agent:summarize_agent"),
+    AgentSpec("pm_agent", ("pm",), "ai_orchestrator.agents.pm.pm_agent:pm_agent"),
+    AgentSpec("pm_director_agent", ("director",),
+              "ai_orchestrator.agents.pm_director.pm_director_agent:pm_director_agent"),
+    AgentSpec("ideas_agent", ("idea",), "ai_orchestrator.agents.ideas.ideas_agent:ideas_agent"),
+    AgentSpec("ai_infra_agent", ("infra",), "ai_orchestrator.agents.ai_dev.ai_infra_agent:ai_infra_agent"),
+    AgentSpec("ai_dev_agent", ("developer",), "ai_orchestrator.agents.ai_dev.ai_dev_agent:ai_dev_agent"),
+    AgentSpec("orchestrator_agent", ("orchestrate",),
+              "ai_orchestrator.agents.orchestrator.orchestrator_agent:orchestrator_agent"),
+]
+
+# keyword -> agent (a LazyAgent; calling it imports the agent module)
+AGENT_ROUTING = build_routing(BUILTIN_AGENTS)
+
+def log_agent_activity(*args):
+    from ai_orchestrator.agents.logging.agent_activity_logger import log_agent_activity
+    return log_agent_activity(*args)
+
+def log_to_airtable(*args):
+    from ai_orchestrator.agents.airtable_logger.airtable_logger import log_to_airtable
+    return log_to_airtable(*args)
+
+def classifier_agent(prompt):
+    from ai_orchestrator.agents.classifier_agent import classifier_agent
+    return classifier_agent(prompt)
+
+# Airtable logging runs on a background worker (LOG_QUEUE_SIZE, LOG_SPILL_PATH)
+activity_log = build_activity_log(log_agent_activity, log_to_airtable)
+
+# Whole-word matcher over AGENT_ROUTING (priorities and alternate forms: keyword_matcher.ROUTING_KEYWORDS)
+ROUTE_MATCHER = compile_routes(AGENT_ROUTING)
+
+def explain_route(prompt: str):
+    """Show which keywords a prompt matches and which agent route_prompt would pick, without running it."""
+    return explain_match(ROUTE_MATCHER, prompt)
 
 def route_prompt(prompt: str):
-    # ...existing code...
-    prompt_lower = prompt.lower()
-    for keyword, agent in AGENT_ROUTING.items():
-        if keyword in prompt_lower:
-            try:
-                if keyword == "orchestrate":
-                    print("✅ Route matched 'orchestrate'")
-                if callable(agent):
-                    agent_name = agent.__name__
-                    category = keyword.capitalize() if keyword else "General"
-                    # --- Retry logic ---
-                    success, response = try_agent_with_retry(agent, prompt, retries=2, agent_name=agent_name, category=category)
-                    # --- Agent Activity Logging ---
-                    status = "Success" if success else "Failed"
-                    result_summary = str(response)
-                    if len(result_summary) > 300:
-                        result_summary = result_summary[:297] + '...'
-                    try:
-                        log_agent_activity(agent_name, category, status, result_summary)
-                    except Exception as log_err:
-                        print(f"[⚠️ Agent Activity Logging Error]: {log_err}")
-                    return agent_name, response
-                else:
-                    return None, f"⚠️ The agent '{keyword}' is not callable."
-            except Exception as e:
-                # Log error status to Agent Activity
-                try:
-                    log_agent_activity(agent.__name__, keyword.capitalize(), "Error", str(e))
-                except Exception as log_err:
-                    print(f"[⚠️ Agent Activity Logging Error]: {log_err}")
-                return None, f"⚠️ An error occurred while processing your request: {e}"
+    agent_name, response, _ = route_prompt_with_status(prompt)
+    return agent_name, response
+
+def route_prompt_with_status(prompt: str):
+    """
+    route_prompt that also reports the outcome: "routed", "failed" (the agent ran out of
+    retries), "error", "suggested" (classifier suggestion only) or "unrouted".
+    """
+    match = ROUTE_MATCHER.best(prompt)
+    if match is not None:
+        keyword, agent = match.keyword, match.target
+        try:
+            if keyword == "orchestrate":
+                print("✅ Route matched 'orchestrate'")
+            if callable(agent):
+                agent_name = agent.__name__
+                category = keyword.capitalize() if keyword else "General"
+                # --- Retry logic ---
+                # (the final status is logged below, so retry doesn't log the failure itself)
+                success, response = try_agent_with_retry(agent, prompt, retries=2)
+                # --- Agent Activity Logging (queued, written in the background) ---
+                status = "Success" if success else "Failed"
+                result_summary = str(response)
+                if len(result_summary) > 300:
+                    result_summary = result_summary[:297] + '...'
+                activity_log.submit("agent_activity", agent_name, category, status, result_summary)
+                return agent_name, response, "routed" if success else "failed"
+            else:
+                return None, f"⚠️ The agent '{keyword}' is not callable.", "error"
+        except Exception as e:
+            # Log error status to Agent Activity
+            activity_log.submit("agent_activity", getattr(agent, "__name__", keyword), keyword.capitalize(), "Error", str(e))
+            return None, f"⚠️ An error occurred while processing your request: {e}", "error"
     # Fallback: capture and log unrouted prompts for later analysis and classification
     fallback_response = "🤖 I don't recognize that request. Try again with a clearer instruction."
-    try:
-        log_to_airtable(prompt, "unrouted_agent", fallback_response)
-    except Exception as error:
-        print(f"[⚠️ Airtable Logging Error]: {error}")
+    activity_log.submit("prompt", prompt, "unrouted_agent", fallback_response)
     # --- Classifier integration ---
     try:
         suggested_agent = classifier_agent(prompt)
         if suggested_agent != "unclassified":
             print(f"[Classifier Suggestion] Route to: {suggested_agent}")
-            return suggested_agent, f"[Classifier Suggestion] Route to: {suggested_agent}"
+            return suggested_agent, f"[Classifier Suggestion] Route to: {suggested_agent}", "suggested"
     except Exception as clf_err:
         print(f"[⚠️ Classifier Agent Error]: {clf_err}")
-    return None, fallback_response
+    return None, fallback_response, "unrouted"
 
 EXIT_COMMANDS = {"exit", "quit"}
 
@@ -117,44 +139,90 @@ def run_orchestrator():
         agent_name, result = route_prompt(user_prompt)
         print(f"\n🎯 Result:\n{result}")
         if agent_name:
-            log_to_airtable(user_prompt, agent_name, result)
+            activity_log.submit("prompt", user_prompt, agent_name, result)
 
 def run_cli(agent_name, prompt):
-    agent_func = AGENT_ROUTING.get(agent_name)
+    # Accept a routing keyword or an agent name (e.g. travel_agent)
+    agent_func = AGENT_ROUTING.get(agent_name) or next(
+        (agent for agent in AGENT_ROUTING.values() if agent.__name__ == agent_name), None)
     if not agent_func:
         print(f"❌ Unknown agent: {agent_name}")
         sys.exit(1)
     _, result = route_prompt(prompt)
     print(result)
 
-def ensure_fresh_airtable_metadata(max_age_hours=6):
-    # ...existing code...
+def _init_batch_worker():
+    import multiprocessing.util
+    # Pool processes exit without running atexit, so flush queued Airtable logs via a finalizer
+    multiprocessing.util.Finalize(None, activity_log.close, exitpriority=10)
+
+def run_batch_cli(path, output=None, workers=None, executor="thread"):
+    if not os.path.exists(path):
+        print(f"❌ Batch file not found: {path}")
+        sys.exit(1)
+    from ai_orchestrator.utils.batch_runner import run_batch
+    output = output or os.path.splitext(path)[0] + ".results.jsonl"
+    print(f"[Batch] Routing prompts from {path} on a {executor} pool -> {output}")
+    summary = run_batch(
+        route_prompt_with_status, path, output, workers=workers, executor=executor,
+        initializer=_init_batch_worker if executor == "process" else None,
+    )
+    print(f"[Batch] Done: {json.dumps(summary)}")
+
+def ensure_fresh_airtable_metadata(max_age_hours=6, full_export=False):
+    """
+    Keep data_exports/table_metadata.csv and field_metadata.csv current.
+
+    Stale files are refreshed from the Metadata API on a background thread while the
+    CLI starts on the existing copy; missing files are fetched before continuing (one
+    request). Downloading every table's records only happens with full_export=True.
+    """
     exports_dir = 'data_exports'
+    if full_export:
+        from ai_orchestrator.utils.airtable_exporter import export_all_tables_and_metadata
+        print("[Airtable] Exporting all tables and metadata...")
+        export_all_tables_and_metadata()
+        return
     table_meta = os.path.join(exports_dir, 'table_metadata.csv')
     field_meta = os.path.join(exports_dir, 'field_metadata.csv')
     now = time.time()
     for path in [table_meta, field_meta]:
         if not os.path.exists(path):
-            print(f"[Airtable] {os.path.basename(path)} missing. Updating metadata...")
-            export_all_tables_and_metadata()
+            from ai_orchestrator.utils.airtable_metadata import refresh_metadata
+            print(f"[Airtable] {os.path.basename(path)} missing. Fetching metadata...")
+            try:
+                refresh_metadata(output_dir=exports_dir)
+            except Exception as e:
+                print(f"[⚠️ Airtable Metadata Refresh Error]: {e}")
             return
         mtime = os.path.getmtime(path)
         age_hours = (now - mtime) / 3600
         if age_hours > max_age_hours:
-            print(f"[Airtable] {os.path.basename(path)} older than {max_age_hours}h. Updating metadata...")
-            export_all_tables_and_metadata()
+            from ai_orchestrator.utils.airtable_metadata import start_background_refresh
+            print(f"[Airtable] {os.path.basename(path)} older than {max_age_hours}h. "
+                  "Refreshing metadata in the background...")
+            start_background_refresh(output_dir=exports_dir)
             return
     print("[Airtable] Metadata is fresh.")
 
 def run():
     load_dotenv()
     validate_env()
-    ensure_fresh_airtable_metadata()
     parser = argparse.ArgumentParser(description="AI Orchestrator CLI")
     parser.add_argument("--agent", type=str, help="Agent to use (e.g. travel_agent)")
     parser.add_argument("--prompt", type=str, help="Prompt to send to the agent")
+    parser.add_argument("--batch", type=str, metavar="FILE", help="Route every prompt in a JSONL or CSV file")
+    parser.add_argument("--output", type=str, help="Results JSONL for --batch (default: FILE.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel prompts for --batch (default: CPU count)")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Pool type for --batch: thread (I/O-bound agents) or process (CPU-bound)")
+    parser.add_argument("--full-export", action="store_true",
+                        help="Download every Airtable table to data_exports/ (not just the metadata) before starting")
     args = parser.parse_args()
-    if args.agent and args.prompt:
+    ensure_fresh_airtable_metadata(full_export=args.full_export)
+    if args.batch:
+        run_batch_cli(args.batch, args.output, args.workers, args.executor)
+    elif args.agent and args.prompt:
         run_cli(args.agent, args.prompt)
     else:
         run_orchestrator()
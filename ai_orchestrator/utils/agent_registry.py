@@ -0,0 +1,105 @@
+"""
+Lazy agent registry for the orchestrator.
+
+Agents are declared by name, routing keywords and an import path
+("package.module:function"). Nothing is imported until an agent is first called,
+so routing a prompt only pays for the agent it selects, and the CLI and web
+interface start without importing every agent module.
+
+Third-party agents are discovered through the "ai_orchestrator.agents" entry point
+group. Each entry point's name is a routing keyword and its value the agent's
+import path, e.g. in a plugin's pyproject.toml:
+
+    [project.entry-points."ai_orchestrator.agents"]
+    weather = "weather_agent.agent:weather_agent"
+
+Entry points are read from package metadata only; the plugin module itself is
+imported on first use like the built-in agents.
+"""
+import importlib
+import threading
+from dataclasses import dataclass
+from typing import Tuple
+
+ENTRY_POINT_GROUP = "ai_orchestrator.agents"
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    name: str
+    keywords: Tuple[str, ...]
+    import_path: str  # "package.module:function"
+
+
+class LazyAgent:
+    """Callable stand-in for an agent function that imports it on first call."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.__name__ = spec.name
+        self._func = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    module_name, _, attr = self.spec.import_path.partition(":")
+                    func = getattr(importlib.import_module(module_name), attr or self.spec.name)
+                    if not callable(func):
+                        raise TypeError(f"{self.spec.import_path} is not callable")
+                    self._func = func
+        return self._func
+
+    @property
+    def loaded(self):
+        return self._func is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyAgent {self.spec.name} ({self.spec.import_path}, {state})>"
+
+
+def discover_plugins(group=ENTRY_POINT_GROUP):
+    """AgentSpecs for installed plugin agents (entry point name = keyword, value = import path)."""
+    from importlib.metadata import entry_points
+
+    try:
+        found = entry_points(group=group)
+    except TypeError:
+        # Python < 3.10: entry_points() returns a dict of groups
+        found = entry_points().get(group, [])
+    specs = {}
+    for ep in found:
+        module_name, _, attr = ep.value.partition(":")
+        name = attr or module_name.rsplit(".", 1)[-1]
+        spec = specs.get(ep.value)
+        keywords = (spec.keywords if spec else ()) + (ep.name.lower(),)
+        specs[ep.value] = AgentSpec(name, keywords, ep.value)
+    return list(specs.values())
+
+
+def build_routing(specs, plugins=True):
+    """
+    {keyword: LazyAgent} for the given specs plus discovered plugins. Built-in keywords win
+    over a plugin that claims the same keyword.
+    """
+    routing = {}
+    all_specs = list(specs)
+    if plugins:
+        try:
+            all_specs.extend(discover_plugins())
+        except Exception as e:
+            print(f"[⚠️ Agent Plugin Error]: {e}")
+    for spec in all_specs:
+        agent = LazyAgent(spec)
+        for keyword in spec.keywords:
+            if keyword in routing:
+                print(f"[Agent Registry] Keyword '{keyword}' already routes to {routing[keyword].__name__}; "
+                      f"ignoring {spec.name}")
+                continue
+            routing[keyword] = agent
+    return routing
@@ -0,0 +1,105 @@
+"""
+Metadata-only refresh of data_exports/table_metadata.csv and field_metadata.csv.
+
+One request to the Airtable Metadata API (`/meta/bases/{id}/tables`) is enough to
+rebuild both files, so this never pages through table records (that is what
+`export_all_tables_and_metadata` in airtable_exporter is for) and does not need
+pandas. Each file is written to a temporary file in the same directory and moved
+into place with os.replace, so readers see either the old copy or the new one,
+never a partial file.
+"""
+import csv
+import os
+import tempfile
+import threading
+
+import requests
+
+DATA_EXPORTS_DIR = 'data_exports'
+META_TABLES_URL = 'https://api.airtable.com/v0/meta/bases/{base_id}/tables'
+TABLE_METADATA_FILE = 'table_metadata.csv'
+FIELD_METADATA_FILE = 'field_metadata.csv'
+
+_refresh_lock = threading.Lock()
+
+
+def fetch_table_objects(base_id, api_token, timeout=30):
+    """Fetch all table objects (with their fields) from the Airtable Metadata API."""
+    response = requests.get(
+        META_TABLES_URL.format(base_id=base_id),
+        headers={'Authorization': f'Bearer {api_token}'},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json().get('tables', [])
+
+
+def _write_csv_atomic(path, fieldnames, rows):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def refresh_metadata(base_id=None, api_token=None, output_dir=DATA_EXPORTS_DIR):
+    """
+    Rewrite table_metadata.csv and field_metadata.csv (same columns as the full export)
+    from a single Metadata API call. Returns (table_metadata_path, field_metadata_path).
+    """
+    base_id = base_id or os.getenv('AIRTABLE_BASE_ID')
+    api_token = api_token or os.getenv('AIRTABLE_API_TOKEN')
+    tables = fetch_table_objects(base_id, api_token)
+    os.makedirs(output_dir, exist_ok=True)
+    table_path = os.path.join(output_dir, TABLE_METADATA_FILE)
+    field_path = os.path.join(output_dir, FIELD_METADATA_FILE)
+    _write_csv_atomic(
+        field_path,
+        ['table_id', 'table_name', 'field_id', 'field_name'],
+        [
+            {
+                'table_id': table['id'],
+                'table_name': table['name'],
+                'field_id': field['id'],
+                'field_name': field['name'],
+            }
+            for table in tables
+            for field in table.get('fields', [])
+        ],
+    )
+    _write_csv_atomic(
+        table_path,
+        ['base_id', 'table_id', 'table_name'],
+        [{'base_id': base_id, 'table_id': table['id'], 'table_name': table['name']} for table in tables],
+    )
+    return table_path, field_path
+
+
+def _refresh_in_background(base_id, api_token, output_dir):
+    try:
+        table_path, field_path = refresh_metadata(base_id, api_token, output_dir)
+        print(f"[Airtable] Metadata refreshed in the background ({os.path.basename(table_path)}, "
+              f"{os.path.basename(field_path)}).")
+    except Exception as e:
+        print(f"[⚠️ Airtable Metadata Refresh Error]: {e} (keeping the existing copy)")
+    finally:
+        _refresh_lock.release()
+
+
+def start_background_refresh(base_id=None, api_token=None, output_dir=DATA_EXPORTS_DIR):
+    """Refresh metadata on a daemon thread. Returns the thread, or None if a refresh is already running."""
+    if not _refresh_lock.acquire(blocking=False):
+        return None
+    thread = threading.Thread(
+        target=_refresh_in_background, args=(base_id, api_token, output_dir),
+        name='airtable-metadata-refresh', daemon=True,
+    )
+    thread.start()
+    return thread
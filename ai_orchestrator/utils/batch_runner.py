@@ -0,0 +1,130 @@
+"""
+Batch prompt execution for the orchestrator CLI (`--batch FILE`).
+
+Prompts are streamed from a JSONL file (one JSON string, or an object with a
+"prompt"/"Prompt" field, per line) or a CSV file with a Prompt column (such as an
+Airtable `Logs` export), routed on a thread or process pool, and written to a
+JSONL results file (replaced on each run) as each one finishes. Only a bounded
+number of prompts are in flight at once, so memory stays flat regardless of the
+input size.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+PROMPT_FIELDS = ("prompt", "Prompt")
+ID_FIELDS = ("id", "ID", "Id")
+
+
+def _record_prompt(record):
+    if isinstance(record, str):
+        return record, None
+    if isinstance(record, dict):
+        prompt = next((record[f] for f in PROMPT_FIELDS if record.get(f)), None)
+        record_id = next((record[f] for f in ID_FIELDS if record.get(f)), None)
+        return prompt, record_id
+    return None, None
+
+
+def read_prompts(path):
+    """Yield (line number, prompt, record id or None) from a JSONL or CSV file, skipping blank prompts."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                prompt, record_id = _record_prompt(row)
+                if prompt and prompt.strip():
+                    yield line_no, prompt.strip(), record_id
+        return
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                prompt, record_id = _record_prompt(json.loads(line))
+            except ValueError:
+                print(f"[Batch] Skipping line {line_no}: not valid JSON")
+                continue
+            if prompt and str(prompt).strip():
+                yield line_no, str(prompt).strip(), record_id
+
+
+def timed_route(route_fn, prompt):
+    """
+    Run route_fn(prompt), which returns (agent, response, status), and return
+    (agent, status, latency_ms, response or error). status comes from route_fn
+    ("routed", "failed", "suggested", "unrouted", ...), or is "error" if it raised.
+    """
+    started = time.perf_counter()
+    try:
+        agent, response, status = route_fn(prompt)
+    except Exception as e:
+        return None, "error", (time.perf_counter() - started) * 1000, str(e)
+    return agent, status, (time.perf_counter() - started) * 1000, response
+
+
+def run_batch(route_fn, input_path, output_path, workers=None, executor="thread", initializer=None):
+    """
+    Route every prompt in input_path through route_fn (see timed_route) on a pool and
+    write one JSON result per prompt to output_path, replacing any earlier results (in
+    completion order; `line` ties it to the input).
+    route_fn (and initializer) must be picklable module-level functions for executor="process".
+    Returns a summary dict.
+    """
+    workers = workers or os.cpu_count() or 4
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    max_in_flight = workers * 4
+    counts = {}
+    total_latency_ms = 0.0
+    started = time.perf_counter()
+    prompts = read_prompts(input_path)
+
+    with open(output_path, "w", encoding="utf-8") as out, pool_cls(max_workers=workers, initializer=initializer) as pool:
+        in_flight = {}
+
+        def write_done(done):
+            nonlocal total_latency_ms
+            for future in done:
+                line_no, prompt, record_id = in_flight.pop(future)
+                try:
+                    agent, status, latency_ms, response = future.result()
+                except Exception as e:
+                    # The worker itself failed (e.g. a process pool worker died)
+                    agent, status, latency_ms, response = None, "error", 0.0, str(e)
+                result = {
+                    "line": line_no,
+                    "id": record_id,
+                    "prompt": prompt,
+                    "agent": agent,
+                    "status": status,
+                    "latency_ms": round(latency_ms, 1),
+                    "response": str(response),
+                }
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts[status] = counts.get(status, 0) + 1
+                total_latency_ms += latency_ms
+
+        for line_no, prompt, record_id in prompts:
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                write_done(done)
+            in_flight[pool.submit(timed_route, route_fn, prompt)] = (line_no, prompt, record_id)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            write_done(done)
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        "prompts": total,
+        "statuses": counts,
+        "workers": workers,
+        "executor": executor,
+        "elapsed_s": round(elapsed, 2),
+        "prompts_per_s": round(total / elapsed, 2) if elapsed > 0 else None,
+        "avg_latency_ms": round(total_latency_ms / total, 1) if total else None,
+        "output": output_path,
+    }
@@ -0,0 +1,138 @@
+"""
+Compiled whole-word keyword matcher for prompt routing.
+
+Keywords (single words or multi-word phrases) are compiled once into a trie keyed by
+word, so a prompt is tokenized and scanned in a single pass whose cost depends on the
+prompt length, not on how many keywords are registered. Matching is on whole words:
+"log" matches "log this" but not "blog", and "pm" does not match "npm".
+
+When a prompt matches several keywords, the highest priority wins; ties go to the
+match that appears first in the prompt.
+
+The orchestrator's keyword priorities (ROUTING_KEYWORDS), compile_routes(routing) and
+explain_route(matcher, prompt) live here too. main.py and ai_orchestrator/__main__.py
+compile their AGENT_ROUTING into ROUTE_MATCHER and expose explain_route(prompt), which
+explains a prompt against that live matcher.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+_TERMINAL = object()
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    keyword: str      # the routing keyword this form belongs to
+    form: str         # the word or phrase that matched
+    target: Any
+    priority: int
+    start: int        # character offsets of the match in the prompt
+    end: int
+
+
+def tokenize(text):
+    """Lowercased words of text as regex matches (offsets into the original string)."""
+    return list(WORD_PATTERN.finditer(text.lower()))
+
+
+class KeywordMatcher:
+    """Word trie mapping keywords and their alternate forms to routing targets."""
+
+    def __init__(self):
+        self._root = {}
+        self.keywords = {}
+
+    def add(self, keyword, target, priority=0, forms=()):
+        """Register keyword (plus any alternate whole-word forms) for target."""
+        for form in (keyword, *forms):
+            words = [m.group() for m in tokenize(form)]
+            if not words:
+                raise ValueError(f"keyword form {form!r} contains no words")
+            node = self._root
+            for word in words:
+                node = node.setdefault(word, {})
+            node[_TERMINAL] = (keyword, " ".join(words), target, priority)
+        self.keywords[keyword] = (target, priority)
+        return self
+
+    def find_all(self, text) -> List[KeywordMatch]:
+        """Every keyword match in text, in prompt order (longest phrase first at a position)."""
+        words = tokenize(text)
+        matches = []
+        for i in range(len(words)):
+            node = self._root
+            found = []
+            for j in range(i, len(words)):
+                node = node.get(words[j].group())
+                if node is None:
+                    break
+                entry = node.get(_TERMINAL)
+                if entry is not None:
+                    keyword, form, target, priority = entry
+                    found.append(KeywordMatch(keyword, form, target, priority, words[i].start(), words[j].end()))
+            matches.extend(reversed(found))
+        return matches
+
+    def best(self, text) -> Optional[KeywordMatch]:
+        """The winning match: highest priority, then earliest in the prompt. None if nothing matches."""
+        matches = self.find_all(text)
+        if not matches:
+            return None
+        return min(matches, key=lambda m: (-m.priority, m.start))
+
+
+# Orchestrator routing keywords: priority (higher wins when a prompt matches several)
+# and the other whole words that select the keyword. Matching is on whole words, so
+# "log" ignores "blog" and "pm" ignores "npm".
+ROUTING_KEYWORDS = {
+    "trip": (90, ("trips",)),
+    "log": (80, ("logs", "logging", "logged")),
+    "summarize": (70, ("summarise", "summarized", "summarizing")),
+    "pm": (60, ("pms",)),
+    "director": (50, ("directors",)),
+    "idea": (40, ("ideas",)),
+    "infra": (30, ("infrastructure",)),
+    "developer": (20, ("developers",)),
+    "orchestrate": (10, ("orchestrated", "orchestrating", "orchestration")),
+}
+
+
+def compile_routes(routing, keywords=ROUTING_KEYWORDS):
+    """Compile a {keyword: agent} routing table into a matcher (recompile after changing the table)."""
+    matcher = KeywordMatcher()
+    for keyword, agent in routing.items():
+        priority, forms = keywords.get(keyword, (0, ()))
+        matcher.add(keyword, agent, priority, forms)
+    return matcher
+
+
+def _agent_name(agent):
+    return agent.__name__ if callable(agent) else str(agent)
+
+
+def explain_route(matcher, prompt):
+    """Show which keywords a prompt matches and which agent the matcher would pick, without running it."""
+    matches = matcher.find_all(prompt)
+    selected = matcher.best(prompt)
+    return {
+        "prompt": prompt,
+        "matches": [
+            {
+                "keyword": m.keyword,
+                "matched": prompt[m.start:m.end],
+                "agent": _agent_name(m.target),
+                "priority": m.priority,
+                "position": m.start,
+            }
+            for m in matches
+        ],
+        "selected": {"keyword": selected.keyword, "agent": _agent_name(selected.target)} if selected else None,
+        "reason": (
+            "no keyword matched; falls back to the classifier" if selected is None
+            else "only match" if len(matches) == 1
+            else "highest priority, then earliest in the prompt"
+        ),
+    }
@@ -0,0 +1,196 @@
+"""
+Background pipeline for Airtable logging calls (agent activity, prompt logs).
+
+Callers submit a job by kind ("agent_activity", "prompt", ...) and return
+immediately; a daemon worker thread runs the registered handler for each job in
+order. The queue is bounded: when it is full, or when jobs are still pending at
+exit, they are appended to a JSONL spill file (or dropped and counted if no spill
+file is configured). Spilled jobs are replayed the next time the pipeline starts.
+The pipeline flushes itself at interpreter exit.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class BackgroundLogger:
+    def __init__(self, handlers, max_pending=1000, spill_path=None, flush_timeout=10.0):
+        """
+        handlers: {kind: function}; a job's args are passed to its handler positionally
+        spill_path: JSONL file for jobs that overflow the queue or miss the exit flush
+        flush_timeout: seconds to wait for pending jobs at exit before spilling them
+        """
+        self.handlers = handlers
+        self.spill_path = spill_path
+        self.flush_timeout = flush_timeout
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.completed = 0
+        self.failed = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.replayed = 0
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # A forked child (e.g. a process pool worker) inherits the queue but not the worker thread
+        self.pending = queue.Queue(maxsize=self.pending.maxsize)
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        self._replay_spill()
+
+    def submit(self, kind, *args):
+        """Queue a logging job without blocking; spills or drops it if the queue is full."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown log job kind: {kind}")
+        if self._thread is None:
+            self.start()
+        job = (kind, args, datetime.now(timezone.utc).isoformat())
+        try:
+            self.pending.put_nowait(job)
+        except queue.Full:
+            self._spill([job])
+
+    def _run(self):
+        while True:
+            job = self.pending.get()
+            try:
+                if job is None:
+                    return
+                kind, args, _ = job
+                try:
+                    result = self.handlers[kind](*args)
+                    # log_to_airtable reports HTTP failures by returning False
+                    if result is False:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"[⚠️ Log Pipeline Error]: {kind}: {e}")
+            finally:
+                self.pending.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until every queued job has run (or timeout seconds pass). Returns True if drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.pending.all_tasks_done:
+            while self.pending.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.pending.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self):
+        """Flush pending jobs (up to flush_timeout), spill whatever is left and stop the worker."""
+        if self._thread is None:
+            return
+        if not self.flush(self.flush_timeout):
+            leftover = []
+            while True:
+                try:
+                    job = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                self.pending.task_done()
+                if job is not None:
+                    leftover.append(job)
+            print(f"[Log Pipeline] {len(leftover)} log job(s) still pending at exit")
+            self._spill(leftover)
+        else:
+            self.pending.put(None)
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def _spill(self, jobs):
+        if not jobs:
+            return
+        if not self.spill_path:
+            self.dropped += len(jobs)
+            return
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for kind, args, queued_at in jobs:
+                        f.write(json.dumps({"kind": kind, "args": list(args), "queued_at": queued_at},
+                                           default=str) + "\n")
+            self.spilled += len(jobs)
+        except OSError as e:
+            self.dropped += len(jobs)
+            print(f"[⚠️ Log Pipeline Error]: could not spill {len(jobs)} job(s): {e}")
+
+    def _replay_spill(self):
+        """Queue jobs spilled by an earlier run; anything that still does not fit is spilled again."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replay_path = self.spill_path + ".replay"
+        try:
+            with self._spill_lock:
+                os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError as e:
+            print(f"[⚠️ Log Pipeline Error]: could not replay {self.spill_path}: {e}")
+            return
+        overflow = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                job = (entry["kind"], tuple(entry["args"]), entry["queued_at"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if job[0] not in self.handlers:
+                continue
+            try:
+                self.pending.put_nowait(job)
+                self.replayed += 1
+            except queue.Full:
+                overflow.append(job)
+        self._spill(overflow)
+        os.remove(replay_path)
+        if self.replayed:
+            print(f"[Log Pipeline] Replaying {self.replayed} spilled log job(s)")
+
+    def stats(self):
+        return {
+            "pending": self.pending.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+        }
+
+
+DEFAULT_SPILL_PATH = os.path.expanduser("~/.agent_orchestrator/pending_logs.jsonl")
+
+
+def build_activity_log(log_agent_activity, log_to_airtable):
+    """
+    The orchestrator's Airtable logging pipeline ("agent_activity" and "prompt" jobs),
+    sized by LOG_QUEUE_SIZE and spilling to LOG_SPILL_PATH. Prompts return as soon as
+    the agent does; overflow and jobs that miss the exit flush are replayed next run.
+    """
+    return BackgroundLogger(
+        {"agent_activity": log_agent_activity, "prompt": log_to_airtable},
+        max_pending=int(os.getenv("LOG_QUEUE_SIZE", "1000")),
+        spill_path=os.getenv("LOG_SPILL_PATH", DEFAULT_SPILL_PATH),
+    )
@@ -1,5 +1,4 @@
 import time
-from agents.logging.agent_activity_logger import log_agent_activity
 
 def try_agent_with_retry(agent_fn, prompt, retries=2, agent_name=None, category=None):
     """
@@ -22,11 +21,13 @@ def try_agent_with_retry(agent_fn, prompt, retries=2, agent_name=None, category=
         except Exception as e:
             print(f"[Retry] Attempt {attempt} failed: {e}")
             last_exception = e
-            time.sleep(1)  # Optional: backoff
+            if attempt <= retries:
+                time.sleep(1)  # Optional: backoff (none after the last attempt)
     # All retries failed
     print(f"[Retry] All {retries+1} attempts failed for agent '{agent_fn.__name__}'. Logging failure.")
     if agent_name and category:
         try:
+            from agents.logging.agent_activity_logger import log_agent_activity
             log_agent_activity(agent_name, category, "Failed", str(last_exception))
         except Exception as log_err:
             print(f"[Retry] Error logging failure to Airtable: {log_err}")
@@ -0,0 +1,289 @@
+"""
+Event-loop lag and slow-request watchdog for the FastAPI apps (sms_webhook and
+web_interface).
+
+A heartbeat task sleeps for a short interval and measures how late it wakes up:
+that delay is the event-loop lag. A daemon thread watches the heartbeat; when the
+loop has not ticked for longer than the lag threshold, something is blocking it,
+so the thread samples the loop thread's stack (`sys._current_frames`) while the
+blocking call is still running. When the loop recovers, the stall is logged with
+that stack and counted against the offending frame (the innermost frame outside
+the standard library and site-packages).
+
+`WatchdogMiddleware` times every request. A request still running past the slow
+threshold gets its coroutine chain sampled (the frames down to where it is
+awaiting) and is logged and counted per route when it finishes.
+
+`stats()` reports the current and recent lag plus the top offenders, for a
+diagnostics endpoint.
+"""
+import asyncio
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+
+# Frames under these paths are library code, not the offender
+LIBRARY_PATHS = tuple(
+    path for path in {sysconfig.get_paths().get(key) for key in ("stdlib", "platstdlib", "purelib", "platlib")}
+    if path
+)
+STACK_LIMIT = 12
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _culprit(summary):
+    """The innermost application frame of a StackSummary, as 'file:line in function'."""
+    frames = [frame for frame in summary if not frame.filename.startswith(LIBRARY_PATHS)] or list(summary)
+    if not frames:
+        return "unknown"
+    frame = frames[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+def _coroutine_frames(coro):
+    """Frames of a suspended coroutine chain, outermost first (follows what each one awaits)."""
+    frames = []
+    while coro is not None and len(frames) < 100:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+def _format_stack(summary):
+    return "".join(traceback.StackSummary.from_list(summary[-STACK_LIMIT:]).format())
+
+
+class LoopWatchdog:
+    """
+    Measure event-loop lag and record stalls and slow requests.
+
+    lag_threshold_ms: a loop tick later than this counts as a stall (0 disables sampling)
+    slow_request_ms: requests running longer than this are sampled and logged (0 disables)
+    interval: heartbeat period in seconds
+    """
+
+    def __init__(self, lag_threshold_ms=100, slow_request_ms=2000, interval=0.05, max_offenders=100,
+                 samples=600):
+        self.lag_threshold = lag_threshold_ms / 1000
+        self.slow_request = slow_request_ms / 1000
+        self.interval = interval
+        self.max_offenders = max_offenders
+        self.lags = deque(maxlen=samples)
+        self.current_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self.slow_requests = 0
+        self.stall_offenders = {}
+        self.request_offenders = {}
+        self.recent = deque(maxlen=20)
+        self.in_flight = {}
+        self._last_beat = None
+        self._stall_sample = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    # Lifecycle
+
+    def start(self):
+        """Start the heartbeat task (call from the running loop) and the sampling thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        if self.lag_threshold > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    # Loop side
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            previous_beat, self._last_beat = self._last_beat, now
+            lag = max(0.0, now - expected)
+            self.current_lag_ms = lag * 1000
+            self.max_lag_ms = max(self.max_lag_ms, self.current_lag_ms)
+            self.lags.append(self.current_lag_ms)
+            if self.lag_threshold > 0 and lag > self.lag_threshold:
+                # Only a sample taken during this stall (same last beat) belongs to it
+                sample = self._stall_sample
+                self._record_stall(lag, sample[1] if sample and sample[0] == previous_beat else None)
+            self._stall_sample = None
+            if self.slow_request > 0:
+                self._sample_slow_requests(now)
+
+    def _record_stall(self, lag, sample):
+        self.stalls += 1
+        lag_ms = lag * 1000
+        if sample is None:
+            # The loop recovered before the sampling thread looked
+            culprit, stack = "(not sampled)", ""
+        else:
+            culprit, stack = _culprit(sample), _format_stack(sample)
+        self._count(self.stall_offenders, culprit, lag_ms, stack)
+        self.recent.append({
+            "kind": "stall",
+            "at": datetime.now(timezone.utc).isoformat(),
+            "ms": round(lag_ms, 1),
+            "culprit": culprit,
+        })
+        print(f"[⚠️ Event Loop Stall]: blocked for {lag_ms:.0f}ms in {culprit}\n{stack}".rstrip())
+
+    def _sample_slow_requests(self, now):
+        for request in list(self.in_flight.values()):
+            if request["stack"] is None and now - request["started"] > self.slow_request:
+                task = request["task"]
+                frames = _coroutine_frames(task.get_coro()) if task is not None and not task.done() else []
+                request["stack"] = traceback.StackSummary.extract(
+                    ((frame, frame.f_lineno) for frame in frames), lookup_lines=True)
+
+    def request_started(self, key, label):
+        self.in_flight[key] = {
+            "label": label,
+            "started": time.monotonic(),
+            "task": asyncio.current_task(),
+            "stack": None,
+        }
+
+    def request_finished(self, key):
+        request = self.in_flight.pop(key, None)
+        if request is None or self.slow_request <= 0:
+            return
+        elapsed = time.monotonic() - request["started"]
+        if elapsed <= self.slow_request:
+            return
+        self.slow_requests += 1
+        elapsed_ms = elapsed * 1000
+        summary = request["stack"]
+        stack = _format_stack(summary) if summary else ""
+        where = f" awaiting {_culprit(summary)}" if summary else ""
+        self._count(self.request_offenders, request["label"], elapsed_ms, stack)
+        self.recent.append({
+            "kind": "slow_request",
+            "at": datetime.now(timezone.utc).isoformat(),
+            "ms": round(elapsed_ms, 1),
+            "culprit": request["label"],
+        })
+        print(f"[⚠️ Slow Request]: {request['label']} took {elapsed_ms:.0f}ms{where}\n{stack}".rstrip())
+
+    def _count(self, offenders, key, ms, stack):
+        entry = offenders.get(key)
+        if entry is None:
+            if len(offenders) >= self.max_offenders:
+                # Make room by forgetting the least costly offender
+                del offenders[min(offenders, key=lambda k: offenders[k]["total_ms"])]
+            entry = offenders[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "stack": ""}
+        entry["count"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        if stack:
+            entry["stack"] = stack
+
+    # Sampling thread
+
+    def _watch(self):
+        # Poll at half the threshold so a stall is caught while it is still happening
+        poll = max(self.lag_threshold / 2, 0.005)
+        sampled_beat = None
+        while not self._stop.wait(poll):
+            last_beat = self._last_beat
+            if time.monotonic() - last_beat < self.interval + self.lag_threshold or last_beat == sampled_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                # Handed to the loop as a single assignment; it is logged when the loop recovers
+                self._stall_sample = (last_beat, traceback.extract_stack(frame))
+                sampled_beat = last_beat
+
+    # Reporting
+
+    def stats(self, top=10):
+        lags = sorted(self.lags)
+
+        def ranked(offenders):
+            items = sorted(offenders.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+            return [
+                {
+                    "where": key,
+                    "count": entry["count"],
+                    "total_ms": round(entry["total_ms"], 1),
+                    "max_ms": round(entry["max_ms"], 1),
+                    "stack": entry["stack"],
+                }
+                for key, entry in items
+            ]
+
+        now = time.monotonic()
+        return {
+            "running": self._task is not None,
+            "lag_threshold_ms": round(self.lag_threshold * 1000, 1),
+            "slow_request_ms": round(self.slow_request * 1000, 1),
+            "lag_ms": {
+                "current": round(self.current_lag_ms, 1),
+                "since_last_tick": round(max(0.0, (now - self._last_beat - self.interval) * 1000), 1)
+                if self._last_beat is not None else None,
+                "p50": round(_percentile(lags, 50), 1) if lags else None,
+                "p99": round(_percentile(lags, 99), 1) if lags else None,
+                "max": round(self.max_lag_ms, 1),
+            },
+            "stalls": self.stalls,
+            "slow_requests": self.slow_requests,
+            "in_flight": [
+                {"request": request["label"], "running_ms": round((now - request["started"]) * 1000, 1)}
+                for request in list(self.in_flight.values())
+            ],
+            "top_stalls": ranked(self.stall_offenders),
+            "top_slow_requests": ranked(self.request_offenders),
+            "recent": list(self.recent),
+        }
+
+
+class WatchdogMiddleware:
+    """ASGI middleware that reports every HTTP request's duration to a LoopWatchdog."""
+
+    def __init__(self, app, watchdog, exclude_paths=()):
+        self.app = app
+        self.watchdog = watchdog
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        # Long-lived streams (SSE) would always look slow
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        key = object()
+        self.watchdog.request_started(key, f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.watchdog.request_finished(key)
@@ -3,6 +3,8 @@ import time
 from dotenv import load_dotenv
 from utils.airtable_exporter import export_all_tables_and_metadata
 from utils.retry import try_agent_with_retry
+from utils.keyword_matcher import compile_routes, explain_route as explain_match
+from utils.log_pipeline import build_activity_log
 
 # === Load ENV Vars ===
 load_dotenv()
@@ -34,48 +36,50 @@ AGENT_ROUTING = {
     "orchestrate": orchestrator_agent,
 }
 
+# Airtable logging runs on a background worker (LOG_QUEUE_SIZE, LOG_SPILL_PATH)
+activity_log = build_activity_log(log_agent_activity, log_to_airtable)
+
+# Whole-word matcher over AGENT_ROUTING (priorities and alternate forms: keyword_matcher.ROUTING_KEYWORDS)
+ROUTE_MATCHER = compile_routes(AGENT_ROUTING)
+
 # === Debug: Print agent types at startup ===
 print("[DEBUG] AGENT_ROUTING content:")
 for keyword, agent in AGENT_ROUTING.items():
     print(f"Keyword: {keyword}, Agent: {agent}, Type: {type(agent)}")
 
+def explain_route(prompt: str):
+    """Show which keywords a prompt matches and which agent route_prompt would pick, without running it."""
+    return explain_match(ROUTE_MATCHER, prompt)
+
 def route_prompt(prompt: str):
-    prompt_lower = prompt.lower()
-    for keyword, agent in AGENT_ROUTING.items():
-        if keyword in prompt_lower:
-            try:
-                if keyword == "orchestrate":
-                    print("✅ Route matched 'orchestrate'")
-                if callable(agent):
-                    agent_name = agent.__name__
-                    category = keyword.capitalize() if keyword else "General"
-                    # --- Retry logic ---
-                    success, response = try_agent_with_retry(agent, prompt, retries=2, agent_name=agent_name, category=category)
-                    # --- Agent Activity Logging ---
-                    status = "Success" if success else "Failed"
-                    result_summary = str(response)
-                    if len(result_summary) > 300:
-                        result_summary = result_summary[:297] + '...'
-                    try:
-                        log_agent_activity(agent_name, category, status, result_summary)
-                    except Exception as log_err:
-                        print(f"[⚠️ Agent Activity Logging Error]: {log_err}")
-                    return agent_name, response
-                else:
-                    return None, f"⚠️ The agent '{keyword}' is not callable."
-            except Exception as e:
-                # Log error status to Agent Activity
-                try:
-                    log_agent_activity(agent.__name__, keyword.capitalize(), "Error", str(e))
-                except Exception as log_err:
-                    print(f"[⚠️ Agent Activity Logging Error]: {log_err}")
-                return None, f"⚠️ An error occurred while processing your request: {e}"
+    match = ROUTE_MATCHER.best(prompt)
+    if match is not None:
+        keyword, agent = match.keyword, match.target
+        try:
+            if keyword == "orchestrate":
+                print("✅ Route matched 'orchestrate'")
+            if callable(agent):
+                agent_name = agent.__name__
+                category = keyword.capitalize() if keyword else "General"
+                # --- Retry logic ---
+                # (the final status is logged below, so retry doesn't log the failure itself)
+                success, response = try_agent_with_retry(agent, prompt, retries=2)
+                # --- Agent Activity Logging (queued, written in the background) ---
+                status = "Success" if success else "Failed"
+                result_summary = str(response)
+                if len(result_summary) > 300:
+                    result_summary = result_summary[:297] + '...'
+                activity_log.submit("agent_activity", agent_name, category, status, result_summary)
+                return agent_name, response
+            else:
+                return None, f"⚠️ The agent '{keyword}' is not callable."
+        except Exception as e:
+            # Log error status to Agent Activity
+            activity_log.submit("agent_activity", getattr(agent, "__name__", keyword), keyword.capitalize(), "Error", str(e))
+            return None, f"⚠️ An error occurred while processing your request: {e}"
     # Fallback: capture and log unrouted prompts for later analysis and classification
     fallback_response = "🤖 I don't recognize that request. Try again with a clearer instruction."
-    try:
-        log_to_airtable(prompt, "unrouted_agent", fallback_response)
-    except Exception as error:
-        print(f"[⚠️ Airtable Logging Error]: {error}")
+    activity_log.submit("prompt", prompt, "unrouted_agent", fallback_response)
     # --- Classifier integration ---
     try:
         suggested_agent = classifier_agent(prompt)
@@ -102,7 +106,7 @@ def run_orchestrator():
         agent_name, result = route_prompt(user_prompt)
         print(f"\n🎯 Result:\n{result}")
         if agent_name:
-            log_to_airtable(user_prompt, agent_name, result)
+            activity_log.submit("prompt", user_prompt, agent_name, result)
 
 def ensure_fresh_airtable_metadata(max_age_hours=6):
     """
@@ -0,0 +1,77 @@
+"""
+Bounded-queue batch writer shared by the webhook's background sinks.
+
+Callers enqueue items without blocking (items are dropped and counted when the
+queue is full); a daemon thread collects them into batches of up to `batch_size`
+items, or whatever arrived within `flush_interval` seconds, and hands each batch
+to `write_batch`. Closing drains everything still queued before the thread exits.
+"""
+import queue
+import threading
+import time
+
+
+class BatchWriter:
+    """Base class: subclasses implement write_batch(batch), called on the writer thread."""
+
+    thread_name = "batch-writer"
+
+    def __init__(self, batch_size, flush_interval, max_pending):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the writer thread after writing everything still queued."""
+        if self._thread is not None:
+            self._stop.set()
+            # Wake the writer if it is waiting on an empty queue
+            try:
+                self.pending.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join()
+            self._thread = None
+
+    def enqueue(self, item):
+        """Queue an item for writing. Never blocks; drops (and counts) it when the queue is full."""
+        try:
+            self.pending.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while not self._stop.is_set() or not self.pending.empty():
+            batch = self._collect_batch()
+            if batch:
+                self.write_batch(batch)
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def write_batch(self, batch):
+        raise NotImplementedError
@@ -0,0 +1,343 @@
+"""
+Load-test and benchmark harness for sms_webhook.
+
+Replays synthetic Twilio form posts (a mix of routed, help, non-trigger and
+unauthorized messages) against `sms_webhook.app` and reports throughput and
+latency percentiles. The OpenAI client is pointed at a local OpenAI-compatible
+stub with configurable latency and error rate, so no API key or network is needed.
+
+    python sms_benchmark.py --requests 2000 --concurrency 50
+    python sms_benchmark.py --mode uvicorn --workers 4 --duration 30 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+AUTHORIZED_NUMBER = "+15550000001"
+UNAUTHORIZED_NUMBER = "+15559999999"
+
+# Default traffic mix: kind -> weight
+DEFAULT_MIX = {
+    "routed_default": 50,
+    "routed_agent": 20,
+    "help": 5,
+    "not_triggered": 15,
+    "unauthorized": 10,
+}
+
+STUB_REPLY = (
+    "Here is a concise answer for your request. It covers the main point directly. "
+    "Follow up with another message if you need more detail on any part of it."
+)
+
+# === OpenAI-compatible LLM stand-in ===
+stub_app = FastAPI()
+stub_config = {
+    "latency_ms": float(os.getenv("BENCH_LLM_LATENCY_MS", "300")),
+    "jitter_ms": float(os.getenv("BENCH_LLM_JITTER_MS", "100")),
+    "error_rate": float(os.getenv("BENCH_LLM_ERROR_RATE", "0")),
+}
+
+
+def sample_latency():
+    latency = random.gauss(stub_config["latency_ms"], stub_config["jitter_ms"])
+    return max(latency, 0) / 1000
+
+
+@stub_app.post("/v1/chat/completions")
+async def stub_chat_completions(request: Request):
+    """Mimic the OpenAI chat completions API, streaming or not."""
+    payload = await request.json()
+    model = payload.get("model", "stub-model")
+    if random.random() < stub_config["error_rate"]:
+        await asyncio.sleep(sample_latency() / 2)
+        return JSONResponse(status_code=500, content={"error": {"message": "stub error", "type": "server_error"}})
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    usage = {"prompt_tokens": 40, "completion_tokens": len(STUB_REPLY) // 4, "total_tokens": 40 + len(STUB_REPLY) // 4}
+    latency = sample_latency()
+
+    if not payload.get("stream"):
+        await asyncio.sleep(latency)
+        return JSONResponse(content={
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_REPLY},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    words = STUB_REPLY.split(" ")
+
+    async def stream():
+        # Half the latency before the first token, the rest spread over the chunks
+        await asyncio.sleep(latency / 2)
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(latency / 2 / len(words))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+# === Traffic generation ===
+def build_message(kind, agent_names):
+    """Return (From, Body) for one synthetic message of the given kind."""
+    nonce = uuid.uuid4().hex[:8]
+    if kind == "routed_default":
+        return AUTHORIZED_NUMBER, f"// what should I do today {nonce}"
+    if kind == "routed_agent":
+        agent = random.choice(agent_names) if agent_names else "default"
+        return AUTHORIZED_NUMBER, f"//{agent} settle this {nonce}"
+    if kind == "help":
+        return AUTHORIZED_NUMBER, "//"
+    if kind == "not_triggered":
+        return AUTHORIZED_NUMBER, f"hello {nonce}"
+    return UNAUTHORIZED_NUMBER, f"//hello {nonce}"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Aggregate (kind, status, latency_s) samples into a report dict."""
+    def stats(latencies):
+        latencies = sorted(latencies)
+        return {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+
+    by_kind = {}
+    for kind, _, latency in samples:
+        by_kind.setdefault(kind, []).append(latency)
+    failures = sum(1 for _, status, _ in samples if status != 200)
+    return {
+        "requests": len(samples),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "latency": stats([latency for _, _, latency in samples]),
+        "by_kind": {kind: stats(latencies) for kind, latencies in sorted(by_kind.items())},
+    }
+
+
+async def run_load(client, args, agent_names):
+    """Drive the webhook with `concurrency` workers until the request count or duration is hit."""
+    kinds = list(args.mix)
+    weights = [args.mix[kind] for kind in kinds]
+    # Unrecorded warm-up so first-call imports and connection setup don't skew the tail
+    for kind in kinds * args.warmup:
+        from_number, body = build_message(kind, agent_names)
+        await client.post("/sms", data={"From": from_number, "Body": body, "MessageSid": f"SM{uuid.uuid4().hex}"})
+
+    samples = []
+    issued = 0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    async def worker():
+        nonlocal issued
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif issued >= args.requests:
+                return
+            issued += 1
+            kind = random.choices(kinds, weights)[0]
+            from_number, body = build_message(kind, agent_names)
+            data = {"From": from_number, "Body": body, "MessageSid": f"SM{uuid.uuid4().hex}"}
+            started = time.perf_counter()
+            try:
+                response = await client.post("/sms", data=data)
+                status = response.status_code
+            except Exception:
+                status = 0
+            samples.append((kind, status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    return summarize(samples, time.perf_counter() - started)
+
+
+def webhook_env(args, llm_base_url):
+    env = {
+        "ALLOWED_NUMBERS": AUTHORIZED_NUMBER,
+        "OPENAI_API_KEY": "sk-benchmark",
+        # Deferred runs must never text real numbers
+        "SMS_SENDER": "local",
+        "OPENAI_BASE_URL": llm_base_url,
+        "BENCH_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "BENCH_LLM_JITTER_MS": str(args.llm_jitter_ms),
+        "BENCH_LLM_ERROR_RATE": str(args.llm_error_rate),
+    }
+    if args.no_cache:
+        env["REPLY_CACHE_MAX_ENTRIES"] = "0"
+    return env
+
+
+async def run_in_process(args):
+    """Run sms_webhook.app and the LLM stub in this process over ASGI transports."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    stub_config.update(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, error_rate=args.llm_error_rate)
+    os.environ.update(webhook_env(args, "http://llm-stub/v1"))
+    import sms_webhook
+
+    sms_webhook.client = AsyncOpenAI(
+        api_key="sk-benchmark",
+        base_url="http://llm-stub/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app)),
+    )
+    agent_names = sorted(name for name in sms_webhook.routing.agent_names if name != "default")
+    transport = httpx.ASGITransport(app=sms_webhook.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://webhook") as client:
+        await sms_webhook.start_background_tasks()
+        try:
+            return await run_load(client, args, agent_names)
+        finally:
+            await sms_webhook.stop_background_tasks()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(url, timeout=30):
+    import httpx
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+async def run_under_uvicorn(args):
+    """Run the LLM stub and sms_webhook.app as real uvicorn servers and load them over HTTP."""
+    import httpx
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    stub_port, webhook_port = free_port(), free_port()
+    env = dict(os.environ, **webhook_env(args, f"http://127.0.0.1:{stub_port}/v1"))
+    uvicorn_cmd = [sys.executable, "-m", "uvicorn", "--log-level", "warning", "--host", "127.0.0.1"]
+    processes = [
+        subprocess.Popen(uvicorn_cmd + ["--port", str(stub_port), "sms_benchmark:stub_app"], cwd=here, env=env),
+        subprocess.Popen(uvicorn_cmd + ["--port", str(webhook_port), "--workers", str(args.workers),
+                                        "sms_webhook:app"], cwd=here, env=env),
+    ]
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{stub_port}/docs")
+        await wait_until_ready(f"http://127.0.0.1:{webhook_port}/debug/stats")
+        with open(os.path.join(here, "agents.json"), "r", encoding="utf-8") as f:
+            agent_names = sorted(a["name"].lower() for a in json.load(f)["agents"] if a["name"].lower() != "default")
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{webhook_port}", limits=limits, timeout=60) as client:
+            return await run_load(client, args, agent_names)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def parse_mix(value):
+    """Parse 'kind=weight,kind=weight' into a traffic mix dict."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown message kind: {kind.strip()}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def print_report(report):
+    print(f"Requests: {report['requests']}  Failures: {report['failures']}  "
+          f"Elapsed: {report['elapsed_s']}s  Throughput: {report['throughput_rps']} req/s")
+    rows = [("all", report["latency"])] + list(report["by_kind"].items())
+    print(f"{'kind':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, stats in rows:
+        print(f"{kind:<16}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SMS webhook against a local LLM stub")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--requests", type=int, default=1000, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="run for this many seconds instead")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent simulated senders")
+    parser.add_argument("--warmup", type=int, default=2, help="unrecorded warm-up rounds over every message kind")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="traffic mix, e.g. routed_default=50,routed_agent=20,help=5,not_triggered=15,unauthorized=10")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the webhook reply cache")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    runner = run_in_process if args.mode == "inprocess" else run_under_uvicorn
+    report = asyncio.run(runner(args))
+    report["config"] = {
+        "mode": args.mode,
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_jitter_ms": args.llm_jitter_ms,
+        "llm_error_rate": args.llm_error_rate,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Delivery tracking for SMS replies from Twilio status callbacks.
+
+Each reply is registered under the inbound MessageSid (inline TwiML replies,
+whose callback URL carries it as `inbound=`) and any outbound SIDs (REST sends).
+Status callbacks (queued, sent, delivered, undelivered, failed) are matched by
+SID and timed from when the webhook received the inbound message, giving
+receive-to-deliver latency per agent. Pending records expire after a TTL.
+"""
+import time
+from collections import OrderedDict, deque
+
+FAILED_STATUSES = ("failed", "undelivered")
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class DeliveryTracker:
+    """Join status callbacks to replies by SID and keep per-agent delivery latency samples."""
+
+    def __init__(self, max_pending=10000, ttl_seconds=3600, samples_per_agent=1000):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.samples_per_agent = samples_per_agent
+        # sid -> record; a record can be indexed by its inbound and outbound SIDs
+        self.pending = OrderedDict()
+        self.latencies = {}
+        self.delivered = {}
+        self.failed = {}
+        self.callbacks = 0
+        self.unmatched = 0
+
+    def track(self, agent, received_at, sids):
+        """Register a reply sent for an inbound message received at `received_at` (epoch seconds)."""
+        sids = [sid for sid in sids if sid]
+        if not sids:
+            return
+        record = {
+            "agent": agent or "none",
+            "received_at": received_at,
+            "expires_at": time.monotonic() + self.ttl_seconds,
+            "statuses": {},
+            "error_code": None,
+        }
+        for sid in sids:
+            self.pending[sid] = record
+            self.pending.move_to_end(sid)
+        self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.pending:
+            sid, record = next(iter(self.pending.items()))
+            if len(self.pending) <= self.max_pending and record["expires_at"] > now:
+                break
+            del self.pending[sid]
+
+    def update(self, sid, status, inbound_sid=None, error_code=None, now=None):
+        """
+        Apply one status callback. Returns (agent, ms since receipt) when it records a new
+        status, None for unknown SIDs and repeated statuses.
+        """
+        self.callbacks += 1
+        record = self.pending.get(sid) or self.pending.get(inbound_sid)
+        if record is None:
+            self.unmatched += 1
+            return None
+        if sid and sid not in self.pending:
+            self.pending[sid] = record
+        if status in record["statuses"]:
+            # Duplicate callback, or a later part of a split reply
+            return None
+        elapsed_ms = ((now or time.time()) - record["received_at"]) * 1000
+        record["statuses"][status] = round(elapsed_ms, 1)
+        agent = record["agent"]
+        if status == "delivered":
+            samples = self.latencies.get(agent)
+            if samples is None:
+                samples = self.latencies[agent] = deque(maxlen=self.samples_per_agent)
+            samples.append(elapsed_ms)
+            self.delivered[agent] = self.delivered.get(agent, 0) + 1
+        elif status in FAILED_STATUSES:
+            record["error_code"] = error_code
+            self.failed[agent] = self.failed.get(agent, 0) + 1
+        return agent, elapsed_ms
+
+    def lookup(self, sid):
+        """Delivery statuses (ms since receipt) for an event's SID, or None."""
+        record = self.pending.get(sid) if sid else None
+        if record is None or not record["statuses"]:
+            return None
+        delivery = {"statuses": dict(record["statuses"])}
+        if record["error_code"]:
+            delivery["error_code"] = record["error_code"]
+        return delivery
+
+    def stats(self):
+        agents = {}
+        for agent in sorted(set(self.delivered) | set(self.failed)):
+            samples = sorted(self.latencies.get(agent, ()))
+            agents[agent] = {
+                "delivered": self.delivered.get(agent, 0),
+                "failed": self.failed.get(agent, 0),
+                "p50_ms": round(_percentile(samples, 50), 1) if samples else None,
+                "p95_ms": round(_percentile(samples, 95), 1) if samples else None,
+                "p99_ms": round(_percentile(samples, 99), 1) if samples else None,
+                "max_ms": round(samples[-1], 1) if samples else None,
+            }
+        return {
+            "callbacks": self.callbacks,
+            "unmatched": self.unmatched,
+            "pending": len(self.pending),
+            "agents": agents,
+        }
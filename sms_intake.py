@@ -0,0 +1,159 @@
+"""
+Invoke intake flow for the SMS webhook (Python port of lib/invoke.ts).
+
+greeting -> awaiting_category -> completed. Replies are static templates, so a
+message is answered from the per-phone state in memory without touching the LLM.
+States live in a bounded LRU cache; when a persister is configured they are
+written behind to the `conversations` table and read back on a cache miss.
+"""
+import asyncio
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+CATEGORY_OPTIONS = {
+    1: "Tasks",
+    2: "Reminders",
+    3: "Planning",
+    4: "Money",
+    5: "Coordination",
+    6: "Something else",
+}
+
+INTAKE_QUESTION = """Perfect. Last one — what are you most excited to invoke? Reply with a number:
+1 Tasks
+2 Reminders
+3 Planning
+4 Money
+5 Coordination
+6 Something else"""
+
+COMPLETION_MESSAGE = (
+    "You're on the early list. We're launching soon — I'll text you when your spot opens. "
+    "You can //invoke here anytime for updates."
+)
+
+CATEGORY_REMINDER = (
+    "Please reply with a number 1-6 to let us know what you're most interested in:\n"
+    "1 Tasks\n2 Reminders\n3 Planning\n4 Money\n5 Coordination\n6 Something else"
+)
+
+COMPLETED_REPLY = (
+    "Thanks for reaching out! You're on the early list. "
+    'Reply "//invoke" anytime for updates or to change your preferences.'
+)
+
+FALLBACK_REPLY = (
+    'Hi there! Reply "//invoke" to get started or reply with a number 1-6 '
+    "if you're selecting your interest."
+)
+
+TRIGGER_WORDS = ("//invoke", "hello", "hi", "start", "invoke")
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    step: str = "greeting"
+    last_message_at: Optional[str] = None
+
+    def to_dict(self):
+        """Same JSON shape as the TypeScript ConversationState stored in conversations.state."""
+        state = {"step": self.step}
+        if self.last_message_at:
+            state["lastMessageAt"] = self.last_message_at
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(step=state.get("step", "greeting"), last_message_at=state.get("lastMessageAt"))
+
+
+def is_invoke_trigger(body):
+    text = body.strip().lower()
+    return any(word in text for word in TRIGGER_WORDS)
+
+
+def process_message(body, state=None):
+    """Advance the intake flow. Returns (reply, new_state, category or None)."""
+    state = state or ConversationState()
+    text = body.strip().lower()
+    now = datetime.now(timezone.utc).isoformat()
+
+    # Trigger words (or a first message) restart the flow with the intake question
+    if is_invoke_trigger(text) or state.step == "greeting":
+        return INTAKE_QUESTION, ConversationState("awaiting_category", now), None
+
+    if state.step == "awaiting_category":
+        digits = re.sub(r"[^0-9]", "", text)
+        category = int(digits) if digits else None
+        if category in CATEGORY_OPTIONS:
+            return COMPLETION_MESSAGE, ConversationState("completed", now), category
+        return CATEGORY_REMINDER, ConversationState("awaiting_category", now), None
+
+    if state.step == "completed":
+        return COMPLETED_REPLY, ConversationState("completed", now), None
+
+    return FALLBACK_REPLY, state, None
+
+
+def get_category_name(category):
+    return CATEGORY_OPTIONS.get(category)
+
+
+class IntakeStateCache:
+    """Bounded LRU of per-phone ConversationState, optionally backed by a write-behind persister."""
+
+    def __init__(self, max_entries, persister=None):
+        self.max_entries = max_entries
+        self.persister = persister
+        self.states = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_errors = 0
+
+    async def get(self, phone):
+        state = self.states.get(phone)
+        if state is not None:
+            self.states.move_to_end(phone)
+            self.hits += 1
+            return state
+        self.misses += 1
+        state = ConversationState()
+        if self.persister is not None:
+            try:
+                stored = await asyncio.to_thread(self.persister.load_conversation, phone)
+                if stored:
+                    state = ConversationState.from_dict(stored)
+            except Exception as e:
+                # A store outage falls back to a fresh conversation rather than failing the reply
+                self.load_errors += 1
+                print(f"[⚠️ Intake State Error]: {e}")
+        return state
+
+    def put(self, phone, state):
+        self.states[phone] = state
+        self.states.move_to_end(phone)
+        while len(self.states) > self.max_entries:
+            self.states.popitem(last=False)
+            self.evictions += 1
+        if self.persister is not None:
+            self.persister.save_conversation(phone, state.to_dict())
+
+    async def handle(self, phone, body):
+        """Run one message through the intake flow. Returns (reply, new_state, category or None)."""
+        reply, state, category = process_message(body, await self.get(phone))
+        self.put(phone, state)
+        return reply, state, category
+
+    def stats(self):
+        return {
+            "size": len(self.states),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "load_errors": self.load_errors,
+        }
@@ -0,0 +1,150 @@
+"""
+Durable append-only event journal for the SMS webhook.
+
+Events are handed to a background thread through a bounded queue (see
+sms_batch_writer) and written to SQLite (WAL mode) in batches, so the request
+path never waits on disk.
+Queries are served from indexes on timestamp, phone number and agent.
+"""
+import json
+import sqlite3
+from datetime import datetime
+
+from sms_batch_writer import BatchWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seq INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    ts_epoch REAL NOT NULL,
+    from_number TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    authorized INTEGER NOT NULL,
+    triggered INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_events_from_ts ON events(from_number, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_events_agent_ts ON events(agent, ts_epoch);
+"""
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp (or epoch seconds) into epoch seconds."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class EventJournal(BatchWriter):
+    """SQLite-backed event journal with a batched background flusher."""
+
+    thread_name = "event-journal"
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_pending=10000):
+        super().__init__(batch_size, flush_interval, max_pending)
+        self.path = path
+        self.written = 0
+        self.flush_errors = 0
+        self._writer_conn = None
+
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, event):
+        """Queue an event for writing. Never blocks; drops (and counts) when the queue is full."""
+        self.enqueue(event)
+
+    def _run(self):
+        # The flusher thread keeps one connection for its whole life
+        self._writer_conn = self._connect()
+        try:
+            super()._run()
+        finally:
+            self._writer_conn.close()
+            self._writer_conn = None
+
+    def write_batch(self, batch):
+        rows = [
+            (
+                event.get("seq", 0),
+                event["timestamp"],
+                parse_timestamp(event["timestamp"]),
+                event.get("from", ""),
+                event.get("agent", ""),
+                int(bool(event.get("authorized"))),
+                int(bool(event.get("triggered"))),
+                json.dumps(event),
+            )
+            for event in batch
+        ]
+        try:
+            with self._writer_conn:
+                self._writer_conn.executemany(
+                    "INSERT INTO events (seq, ts, ts_epoch, from_number, agent, authorized, triggered, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            self.flush_errors += 1
+            print(f"[⚠️ Event Journal Error]: {e}")
+
+    def max_seq(self):
+        """Highest sequence number on disk, so a restarted process keeps seq monotonic."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(seq) FROM events").fetchone()
+            return row[0] or 0
+        finally:
+            conn.close()
+
+    def query(self, start=None, end=None, from_number=None, agent=None, limit=100):
+        """Return journaled events (most recent first) filtered by time range, phone and agent."""
+        clauses = []
+        params = []
+        if from_number is not None:
+            clauses.append("from_number = ?")
+            params.append(from_number)
+        if agent is not None:
+            clauses.append("agent = ?")
+            params.append(agent)
+        if start is not None:
+            clauses.append("ts_epoch >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts_epoch < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT payload FROM events {where} ORDER BY ts_epoch DESC, id DESC LIMIT ?",
+                params,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending": self.pending.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+        }
@@ -0,0 +1,109 @@
+"""
+Per-number conversation memory for the SMS webhook.
+
+Each phone number keeps its last few turns as compact (agent, prompt, reply,
+tokens) tuples. Numbers are kept in least-recently-active order and evicted
+once the estimated token total across all numbers passes a global cap.
+`history()` returns only as many recent turns as fit the caller's token budget.
+
+The store is pluggable: subclasses override `_load` (called when a number is
+not in memory) and `_persist` (called for every new turn) to back it with the
+`conversations` / `messages` tables from the Supabase migrations.
+"""
+from collections import OrderedDict, deque
+
+# Rough per-message overhead (role, separators) in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationStore:
+    """In-memory LRU conversation store bounded per number (turns) and globally (tokens)."""
+
+    def __init__(self, max_turns=6, max_total_tokens=1_000_000):
+        self.max_turns = max_turns
+        self.max_total_tokens = max_total_tokens
+        # phone -> deque of (agent, prompt, reply, tokens), oldest first
+        self.conversations = OrderedDict()
+        self.total_tokens = 0
+        self.evictions = 0
+
+    def _load(self, phone):
+        """Return stored turns for a number not held in memory (override to read a database)."""
+        return None
+
+    def _persist(self, phone, turn):
+        """Called with every new (agent, prompt, reply, tokens) turn (override to write a database)."""
+
+    def _turns(self, phone):
+        turns = self.conversations.get(phone)
+        if turns is None:
+            loaded = self._load(phone)
+            if not loaded:
+                return None
+            turns = deque(loaded[-self.max_turns:])
+            self.conversations[phone] = turns
+            self.total_tokens += sum(turn[3] for turn in turns)
+            self._evict(keep=phone)
+        self.conversations.move_to_end(phone)
+        return turns
+
+    def history(self, phone, agent, token_budget):
+        """
+        Most recent turns with this agent that fit in token_budget, oldest first,
+        as (prompt, reply) pairs.
+        """
+        if token_budget <= 0:
+            return []
+        turns = self._turns(phone)
+        if not turns:
+            return []
+        selected = []
+        used = 0
+        for turn_agent, prompt, reply, tokens in reversed(turns):
+            if turn_agent != agent:
+                continue
+            if used + tokens > token_budget:
+                break
+            selected.append((prompt, reply))
+            used += tokens
+        selected.reverse()
+        return selected
+
+    def record(self, phone, agent, prompt, reply):
+        """Append a completed turn, trimming this number to max_turns and the store to its cap."""
+        turn = (agent, prompt, reply, estimate_tokens(prompt) + estimate_tokens(reply))
+        turns = self._turns(phone)
+        if turns is None:
+            turns = deque()
+            self.conversations[phone] = turns
+        turns.append(turn)
+        self.total_tokens += turn[3]
+        while len(turns) > self.max_turns:
+            self.total_tokens -= turns.popleft()[3]
+        self._evict(keep=phone)
+        self._persist(phone, turn)
+
+    def _evict(self, keep):
+        # Drop least-recently-active numbers, never the one being served
+        while self.total_tokens > self.max_total_tokens and len(self.conversations) > 1:
+            phone, turns = next(iter(self.conversations.items()))
+            if phone == keep:
+                self.conversations.move_to_end(phone)
+                continue
+            del self.conversations[phone]
+            self.total_tokens -= sum(turn[3] for turn in turns)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "numbers": len(self.conversations),
+            "total_tokens": self.total_tokens,
+            "max_total_tokens": self.max_total_tokens,
+            "max_turns": self.max_turns,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,269 @@
+"""
+Write-behind persistence of SMS traffic into the Supabase `messages` / `events` /
+`conversations` schema.
+
+Every logged webhook event is queued and a background thread writes batches
+through a pooled connection: Postgres (the Supabase database, via psycopg's
+connection pool) or a local SQLite file with the same tables for local runs.
+Queueing never blocks; a failed flush is retried with backoff and, if the sink
+stays down, the batch is dropped and counted. The Twilio response never waits.
+
+Mapping (content stays out of `events`, per its no_message_content constraint):
+- messages: an inbound row for each authorized message, an outbound row for each reply
+- events: invoke_started + invoke_completed for routed replies, provider_error for
+  LLM errors, sms_outbound_failed when a deferred send fails
+- conversations: the latest intake state per phone (upserted, last write wins)
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from sms_batch_writer import BatchWriter
+
+# Same tables as supabase/migrations (001 conversations/messages, 002 events) in SQLite types
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    phone TEXT UNIQUE NOT NULL,
+    state TEXT DEFAULT '{}',
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    phone TEXT NOT NULL,
+    direction TEXT NOT NULL CHECK (direction IN ('inbound', 'outbound')),
+    body TEXT NOT NULL,
+    channel TEXT DEFAULT 'web',
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_messages_phone ON messages(phone);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at DESC);
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    ts TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    user_id TEXT NULL,
+    session_id TEXT NULL,
+    event_type TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    meta TEXT DEFAULT '{}',
+    CONSTRAINT no_message_content CHECK (
+        json_extract(meta, '$.message') IS NULL AND
+        json_extract(meta, '$.body') IS NULL AND
+        json_extract(meta, '$.text') IS NULL AND
+        json_extract(meta, '$.content') IS NULL
+    )
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts DESC);
+CREATE INDEX IF NOT EXISTS idx_events_event_type ON events(event_type);
+"""
+
+# Event fields copied into events.meta (never message content)
+META_FIELDS = (
+    "agent", "model", "message_sid", "outbound_sid", "delivery", "cache", "llm_ms", "ttft_ms",
+    "tokens_in", "tokens_out", "segments", "encoding", "history_turns", "queue_wait_ms", "hedged",
+)
+
+
+def phone_hash(phone):
+    return hashlib.sha256(phone.encode()).hexdigest()
+
+
+def rows_for_event(event):
+    """Map one log_event record to (message_rows, event_rows) for the messages / events tables."""
+    messages = []
+    events = []
+    if not event.get("authorized"):
+        return messages, events
+    ts = event["timestamp"]
+    phone = event["from"]
+    error = event.get("error") or ""
+    send_failed = error.startswith("send failed")
+    messages.append((phone, "inbound", event.get("raw_body", ""), "sms", ts))
+    if event.get("reply_text") and not send_failed:
+        messages.append((phone, "outbound", event["reply_text"], "sms", ts))
+
+    if event.get("triggered") and event.get("agent"):
+        meta = {field: event[field] for field in META_FIELDS if event.get(field) not in (None, "")}
+        meta["phone_hash"] = phone_hash(phone)
+        if send_failed:
+            events.append((ts, "sms_outbound_failed", "sms", json.dumps(dict(meta, error=error))))
+        elif error:
+            events.append((ts, "provider_error", "sms", json.dumps(dict(meta, error=error))))
+        else:
+            events.append((ts, "invoke_started", "sms", json.dumps({"agent": meta["agent"],
+                                                                     "phone_hash": meta["phone_hash"]})))
+            events.append((ts, "invoke_completed", "sms", json.dumps(meta)))
+    return messages, events
+
+
+class SQLiteSink:
+    """Local stand-in for the Supabase tables, written from the persister thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            conn.executescript(SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def write(self, messages, events, conversations=()):
+        # One long-lived connection for the persister thread (closed from whoever calls close())
+        if self._conn is None:
+            self._conn = self._connect(check_same_thread=False)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (phone, direction, body, channel, created_at) VALUES (?, ?, ?, ?, ?)",
+                messages,
+            )
+            self._conn.executemany(
+                "INSERT INTO events (ts, event_type, channel, meta) VALUES (?, ?, ?, ?)",
+                events,
+            )
+            self._conn.executemany(
+                "INSERT INTO conversations (phone, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(phone) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                conversations,
+            )
+
+    def load_conversation(self, phone):
+        """Stored conversation state for a phone, or None (reads use their own connection)."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT state FROM conversations WHERE phone = ?", (phone,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class PostgresSink:
+    """Writes to the Supabase Postgres tables through a psycopg connection pool."""
+
+    def __init__(self, dsn, pool_size=2):
+        # Optional dependency: only needed when persisting to Postgres
+        from psycopg_pool import ConnectionPool
+        self.pool = ConnectionPool(dsn, min_size=1, max_size=pool_size, open=True)
+
+    def write(self, messages, events, conversations=()):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(
+                    "INSERT INTO messages (phone, direction, body, channel, created_at) "
+                    "VALUES (%s, %s, %s, %s, %s)",
+                    messages,
+                )
+                cur.executemany(
+                    "INSERT INTO events (ts, event_type, channel, meta) VALUES (%s, %s, %s, %s::jsonb)",
+                    events,
+                )
+                cur.executemany(
+                    "INSERT INTO conversations (phone, state, updated_at) VALUES (%s, %s::jsonb, %s) "
+                    "ON CONFLICT (phone) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at",
+                    conversations,
+                )
+
+    def load_conversation(self, phone):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT state FROM conversations WHERE phone = %s", (phone,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.pool.close()
+
+
+def build_sink(dsn, pool_size=2):
+    """postgres:// or postgresql:// DSNs go to Postgres; anything else is a SQLite file path."""
+    if dsn.startswith(("postgres://", "postgresql://")):
+        return PostgresSink(dsn, pool_size)
+    return SQLiteSink(dsn)
+
+
+class WriteBehindPersister(BatchWriter):
+    """
+    Bounded queue of log_event records and conversation states, flushed to a sink in
+    batches by a background thread.
+    """
+
+    thread_name = "sms-persister"
+
+    def __init__(self, sink, batch_size=100, flush_interval=1.0, max_pending=10000, max_retries=3):
+        super().__init__(batch_size, flush_interval, max_pending)
+        self.sink = sink
+        self.max_retries = max_retries
+        self.written_messages = 0
+        self.written_events = 0
+        self.written_conversations = 0
+        self.flush_errors = 0
+        self.last_error = ""
+
+    def close(self):
+        """Stop the writer after flushing everything still queued, then close the sink."""
+        super().close()
+        self.sink.close()
+
+    def append(self, event):
+        """Queue a log_event record."""
+        self.enqueue(("event", event))
+
+    def save_conversation(self, phone, state):
+        """Queue the latest conversation state (a JSON-able dict) for a phone."""
+        self.enqueue(("conversation", phone, json.dumps(state), datetime.now(timezone.utc).isoformat()))
+
+    def load_conversation(self, phone):
+        """Read a phone's stored conversation state straight from the sink (blocking)."""
+        return self.sink.load_conversation(phone)
+
+    def write_batch(self, batch):
+        messages = []
+        events = []
+        conversations = {}
+        for item in batch:
+            if item[0] == "event":
+                message_rows, event_rows = rows_for_event(item[1])
+                messages.extend(message_rows)
+                events.extend(event_rows)
+            else:
+                # Only the newest state per phone needs writing
+                _, phone, state, updated_at = item
+                conversations[phone] = (phone, state, updated_at)
+        if not messages and not events and not conversations:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.write(messages, events, list(conversations.values()))
+                self.written_messages += len(messages)
+                self.written_events += len(events)
+                self.written_conversations += len(conversations)
+                return
+            except Exception as e:
+                self.flush_errors += 1
+                self.last_error = str(e)
+                print(f"[⚠️ Persistence Error]: {e} (attempt {attempt + 1})")
+                if attempt < self.max_retries and not self._stop.is_set():
+                    time.sleep(min(0.5 * 2 ** attempt, 5))
+        self.dropped += len(batch)
+
+    def stats(self):
+        return {
+            "pending": self.pending.qsize(),
+            "written_messages": self.written_messages,
+            "written_events": self.written_events,
+            "written_conversations": self.written_conversations,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,158 @@
+"""
+Hot-reloadable agent registry and allowlist for the SMS webhook.
+
+agents.json and the ALLOWED_NUMBERS allowlist are compiled into an immutable
+RoutingTable. A RegistryWatcher polls the source files (mtime + size, then a
+content hash) and compiles a replacement when they change; the webhook swaps it
+in with a single reference assignment, so in-flight requests keep the snapshot
+they started with. A file that fails validation is rejected and the live table
+stays in place.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from dotenv import dotenv_values
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+
+
+class RegistryError(Exception):
+    """agents.json or the allowlist failed validation."""
+
+
+def parse_allowed_numbers(value):
+    return frozenset(num.strip() for num in (value or "").split(",") if num.strip())
+
+
+class RoutingTable:
+    """Immutable snapshot of the agents, their full system prompts and the allowlist."""
+
+    def __init__(self, agent_configs, allowed_numbers, prompt_suffix="", version=""):
+        self.agent_configs = agent_configs
+        self.agent_names = frozenset(agent_configs)
+        # System prompts are precomputed with the SMS constraint already appended
+        self.system_prompts = {
+            name: config.get("system_prompt", DEFAULT_SYSTEM_PROMPT) + prompt_suffix
+            for name, config in agent_configs.items()
+        }
+        self.allowed_numbers = allowed_numbers
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+
+    def agent_config(self, agent_name):
+        return self.agent_configs.get(agent_name, self.agent_configs["default"])
+
+    def system_prompt(self, agent_name):
+        return self.system_prompts.get(agent_name, self.system_prompts["default"])
+
+
+def compile_agents(raw):
+    """Validate agents.json content and return {lowercased name: config}. Raises RegistryError."""
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise RegistryError(f"invalid JSON: {e}") from e
+    agents = data.get("agents") if isinstance(data, dict) else None
+    if not isinstance(agents, list) or not agents:
+        raise RegistryError('"agents" must be a non-empty list')
+
+    configs = {}
+    for agent in agents:
+        if not isinstance(agent, dict) or not isinstance(agent.get("name"), str) or not agent["name"].strip():
+            raise RegistryError("every agent needs a non-empty string name")
+        name = agent["name"].lower()
+        if name in configs:
+            raise RegistryError(f"duplicate agent name: {name}")
+        for key in ("system_prompt", "model"):
+            if key in agent and not isinstance(agent[key], str):
+                raise RegistryError(f"{name}: {key} must be a string")
+        fallback_models = agent.get("fallback_models", [])
+        if not isinstance(fallback_models, list) or not all(isinstance(m, str) for m in fallback_models):
+            raise RegistryError(f"{name}: fallback_models must be a list of model names")
+        for key in ("max_concurrency", "latency_budget_ms"):
+            value = agent.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise RegistryError(f"{name}: {key} must be a positive number")
+        history_tokens = agent.get("history_tokens")
+        if history_tokens is not None and (isinstance(history_tokens, bool) or not isinstance(history_tokens, int)
+                                           or history_tokens < 0):
+            raise RegistryError(f"{name}: history_tokens must be a non-negative integer")
+        configs[name] = agent
+    if "default" not in configs:
+        raise RegistryError('a "default" agent is required')
+    return configs
+
+
+class RegistryWatcher:
+    """
+    Compile RoutingTables from agents.json and the allowlist, and notice when they change.
+
+    The allowlist is re-read from `dotenv_path` when given (and it defines
+    ALLOWED_NUMBERS); otherwise `allowed_numbers` is used as a fixed value.
+    """
+
+    def __init__(self, agents_path, prompt_suffix="", dotenv_path=None, allowed_numbers=""):
+        self.agents_path = agents_path
+        self.prompt_suffix = prompt_suffix
+        self.dotenv_path = dotenv_path
+        self.allowed_numbers = allowed_numbers
+        self.stamps = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = ""
+
+    def _stamps(self):
+        stamps = []
+        for path in (self.agents_path, self.dotenv_path):
+            try:
+                stat = path.stat() if path is not None else None
+                stamps.append((stat.st_mtime_ns, stat.st_size) if stat else None)
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def load(self):
+        """Read and compile the current files into a RoutingTable. Raises RegistryError."""
+        # Stat before reading so a write that lands mid-load is picked up next poll
+        self.stamps = self._stamps()
+        try:
+            agents_raw = self.agents_path.read_bytes()
+        except OSError as e:
+            raise RegistryError(f"cannot read {self.agents_path.name}: {e}") from e
+        allowed = self.allowed_numbers
+        if self.dotenv_path is not None and self.dotenv_path.exists():
+            allowed = dotenv_values(self.dotenv_path).get("ALLOWED_NUMBERS", allowed)
+        allowed_numbers = parse_allowed_numbers(allowed)
+        digest = hashlib.sha256(agents_raw)
+        digest.update(",".join(sorted(allowed_numbers)).encode())
+        return RoutingTable(compile_agents(agents_raw), allowed_numbers, self.prompt_suffix,
+                            digest.hexdigest()[:12])
+
+    def check(self, current):
+        """Return a new RoutingTable if the sources changed and compile cleanly, else None."""
+        if self._stamps() == self.stamps:
+            return None
+        try:
+            table = self.load()
+        except RegistryError as e:
+            self.reload_errors += 1
+            self.last_error = str(e)
+            print(f"[⚠️ Agent Registry Error]: {e} (keeping version {current.version})")
+            return None
+        if table.version == current.version:
+            return None
+        self.reloads += 1
+        self.last_error = ""
+        return table
+
+    def stats(self, current):
+        return {
+            "version": current.version,
+            "loaded_at": current.loaded_at,
+            "agents": sorted(current.agent_names),
+            "allowed_numbers": len(current.allowed_numbers),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,155 @@
+"""
+GSM-7 / UCS-2 aware SMS segmentation.
+
+A message that fits the GSM-7 alphabet is billed in 160-septet segments (153
+when concatenated); a single character outside it switches the whole message
+to UCS-2 at 70 code units (67 when concatenated). These helpers detect the
+encoding, transliterate common typographic characters back to GSM-7, count
+billed segments and split text at word boundaries on exact segment limits.
+"""
+import unicodedata
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Extension table characters cost two septets (escape + char)
+GSM7_EXTENDED = frozenset("\f^{}\\[]~|€")
+
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+# encoding -> (single-segment limit, per-segment limit when concatenated)
+SEGMENT_LIMITS = {
+    GSM7: (160, 153),
+    UCS2: (70, 67),
+}
+
+# Characters LLMs like to emit that have a close GSM-7 equivalent
+TRANSLITERATIONS = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",
+    "‹": "'", "›": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+    "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-",
+    "−": "-",
+    "…": "...",
+    "\u00a0": " ", "\u2002": " ", "\u2003": " ", "\u2009": " ", "\u200a": " ", "\u202f": " ",
+    "\u200b": "", "\u200d": "", "\ufe0f": "", "\u00ad": "",
+    "•": "-", "·": "-", "●": "-",
+    "×": "x", "÷": "/", "→": "->", "←": "<-",
+    "™": "TM", "©": "(c)", "®": "(R)", "¢": "c", "°": " deg",
+    "\t": " ",
+}
+
+
+def char_units(ch, encoding):
+    """Billed units for one character: septets for GSM-7, UTF-16 code units for UCS-2."""
+    if encoding == GSM7:
+        return 2 if ch in GSM7_EXTENDED else 1
+    return 2 if ord(ch) > 0xFFFF else 1
+
+
+def is_gsm7(text):
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+
+def detect_encoding(text):
+    return GSM7 if is_gsm7(text) else UCS2
+
+
+def count_units(text, encoding=None):
+    encoding = encoding or detect_encoding(text)
+    return sum(char_units(ch, encoding) for ch in text)
+
+
+def count_segments(text, encoding=None):
+    """Number of segments a single (concatenated) message with this text is billed as."""
+    if not text:
+        return 0
+    encoding = encoding or detect_encoding(text)
+    single, multi = SEGMENT_LIMITS[encoding]
+    units = count_units(text, encoding)
+    if units <= single:
+        return 1
+    return -(-units // multi)
+
+
+def max_units(encoding, max_segments):
+    """Unit capacity of a message allowed to span `max_segments` segments."""
+    single, multi = SEGMENT_LIMITS[encoding]
+    return single if max_segments <= 1 else max_segments * multi
+
+
+def prefix_length(text, units, encoding=None):
+    """Length of the longest prefix of text that fits in `units` billed units."""
+    encoding = encoding or detect_encoding(text)
+    used = 0
+    for index, ch in enumerate(text):
+        used += char_units(ch, encoding)
+        if used > units:
+            return index
+    return len(text)
+
+
+def transliterate(text, strip_unsupported=False):
+    """
+    Replace characters outside GSM-7 with close equivalents. Accented letters fall
+    back to their unaccented base. With strip_unsupported, anything still outside
+    GSM-7 (emoji, CJK, ...) is dropped so the result is always GSM-7.
+    """
+    out = []
+    for ch in text:
+        if ch in GSM7_BASIC or ch in GSM7_EXTENDED:
+            out.append(ch)
+            continue
+        replacement = TRANSLITERATIONS.get(ch)
+        if replacement is None:
+            base = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+            if base and is_gsm7(base):
+                replacement = base
+            elif strip_unsupported:
+                replacement = ""
+            else:
+                replacement = ch
+        out.append(replacement)
+    result = "".join(out)
+    if strip_unsupported:
+        # Dropped characters can leave doubled or dangling spaces behind
+        result = "\n".join(" ".join(line.split()) for line in result.split("\n"))
+    return result
+
+
+def split_segments(text, encoding=None):
+    """
+    Split text into parts that each fit one standalone segment (160 GSM-7 / 70 UCS-2
+    units), breaking at spaces. Words longer than a segment are split hard.
+    """
+    if not text:
+        return []
+    encoding = encoding or detect_encoding(text)
+    limit = SEGMENT_LIMITS[encoding][0]
+    if count_units(text, encoding) <= limit:
+        return [text]
+
+    parts = []
+    current = ""
+    current_units = 0
+    for word in text.split(" "):
+        word_units = count_units(word, encoding)
+        joiner_units = 1 if current else 0
+        if current_units + joiner_units + word_units <= limit:
+            current = f"{current} {word}" if current else word
+            current_units += joiner_units + word_units
+            continue
+        if current:
+            parts.append(current)
+        while word_units > limit:
+            cut = prefix_length(word, limit, encoding)
+            parts.append(word[:cut])
+            word = word[cut:]
+            word_units = count_units(word, encoding)
+        current, current_units = word, word_units
+    if current:
+        parts.append(current)
+    return parts
@@ -0,0 +1,197 @@
+"""
+Cross-worker state for the SMS webhook.
+
+When uvicorn runs with several workers each process has its own memory, so the
+debug event stream and counters live in a local SQLite file (WAL mode) that
+every worker reads and writes. No external service is needed. Sequence numbers
+come from SQLite, so all workers share one ordered timeline.
+
+Appends are queued and inserted in batches by a background thread (see
+sms_batch_writer), so logging an event never waits on SQLite. Reads still query
+the file directly; callers on the event loop run them with asyncio.to_thread.
+"""
+import json
+import sqlite3
+import threading
+
+from sms_batch_writer import BatchWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_number TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shared_events_from ON events(from_number, seq);
+CREATE INDEX IF NOT EXISTS idx_shared_events_agent ON events(agent, seq);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Trim the shared event table once every this many appends
+TRIM_EVERY = 100
+
+
+class SharedEventStore(BatchWriter):
+    """
+    SQLite-backed drop-in for the in-memory EventStore.
+    Keeps the newest `capacity` events and a table of named counters.
+    An appended event gets its `seq` when the writer thread inserts it; `on_written`
+    (if set) is then called with each written event.
+    """
+
+    thread_name = "shared-state-writer"
+
+    def __init__(self, path, capacity, batch_size=200, flush_interval=0.05, max_pending=10000):
+        super().__init__(batch_size, flush_interval, max_pending)
+        self.path = path
+        self.capacity = capacity
+        self.on_written = None
+        self.written = 0
+        self.write_errors = 0
+        self._lock = threading.Lock()
+        self._appends = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def append(self, event):
+        """Queue an event for the writer thread. Never blocks; drops (and counts) when the queue is full."""
+        self.enqueue(event)
+        return event
+
+    def write_batch(self, batch):
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    for event in batch:
+                        cursor = self._conn.execute(
+                            "INSERT INTO events (from_number, agent, payload) VALUES (?, ?, ?)",
+                            (event["from"], event["agent"], json.dumps(event)),
+                        )
+                        event["seq"] = cursor.lastrowid
+                        self._appends += 1
+                        if self._appends % TRIM_EVERY == 0:
+                            self._conn.execute("DELETE FROM events WHERE seq <= ?", (event["seq"] - self.capacity,))
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            print(f"[⚠️ Shared State Error]: {e}")
+            return
+        self.written += len(batch)
+        if self.on_written is not None:
+            for event in batch:
+                self.on_written(event)
+
+    def _current_seq(self):
+        row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            return self._current_seq()
+
+    @last_seq.setter
+    def last_seq(self, value):
+        # Only ever moves the sequence forward (used to continue after a journal)
+        with self._lock:
+            current = self._current_seq()
+            if value <= current:
+                return
+            if current:
+                self._conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'events'", (value,))
+            else:
+                self._conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('events', ?)", (value,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def query(self, since=None, limit=50, from_number=None, agent=None):
+        """Same contract as EventStore.query: matching events, most recent first."""
+        clauses = []
+        params = []
+        if since is not None:
+            clauses.append("seq > ?")
+            params.append(since)
+        if from_number is not None:
+            clauses.append("from_number = ?")
+            params.append(from_number)
+        if agent is not None:
+            clauses.append("agent = ?")
+            params.append(agent)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Paging forward from a cursor takes the oldest rows first so none are skipped
+        order = "ASC" if since is not None else "DESC"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, payload FROM events {where} ORDER BY seq {order} LIMIT ?", params
+            ).fetchall()
+        matched = []
+        for seq, payload in rows:
+            event = json.loads(payload)
+            event["seq"] = seq
+            matched.append(event)
+        if since is not None:
+            matched.reverse()
+        return matched
+
+    def add_counters(self, deltas):
+        """Add a {name: delta} mapping to the shared counters in one transaction."""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    list(deltas.items()),
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def counters(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        return dict(rows)
+
+    def close(self):
+        """Write everything still queued, then close the connection."""
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending": self.pending.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+
+class CounterSync:
+    """Track process-local counter totals and turn them into deltas for the shared store."""
+
+    def __init__(self):
+        self.pushed = {}
+
+    def deltas(self, totals):
+        deltas = {name: value - self.pushed.get(name, 0) for name, value in totals.items()}
+        self.pushed = dict(totals)
+        return deltas
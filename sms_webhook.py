@@ -1,36 +1,280 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import Response, JSONResponse
+from fastapi import FastAPI, Request, Form, Query
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from twilio.twiml.messaging_response import MessagingResponse
 import os
 import json
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
+from sms_journal import EventJournal, parse_timestamp
+from sms_shared_state import SharedEventStore, CounterSync
+from sms_metrics import Registry
+from sms_segments import (
+    count_segments, detect_encoding, max_units, prefix_length, split_segments, transliterate,
+)
+from sms_registry import RegistryWatcher
+from sms_memory import ConversationStore
+from sms_persistence import WriteBehindPersister, build_sink
+from sms_intake import IntakeStateCache
+from sms_delivery import DeliveryTracker
+from loop_watchdog import LoopWatchdog, WatchdogMiddleware
+
+# An allowlist set in the real environment wins over .env and is not hot-reloaded
+ALLOWED_NUMBERS_FROM_ENVIRONMENT = "ALLOWED_NUMBERS" in os.environ
 
 load_dotenv()
 
-# Initialize OpenAI client
+# LLM client tuning: per-request timeout, pooled connections and a cap on
+# concurrent completions so a burst of texts cannot starve the event loop
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(LLM_MAX_CONCURRENCY)))
+
+# Initialize async OpenAI client with a shared connection pool
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    timeout=LLM_TIMEOUT_SECONDS,
+    max_retries=1,
+    http_client=httpx.AsyncClient(
+        timeout=LLM_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        ),
+    ),
+) if OPENAI_API_KEY else None
+
+# Backpressure: requests beyond the concurrency limit wait in a bounded queue;
+# when that is full the request is shed (canned reply, or deferred delivery)
+LLM_AGENT_MAX_CONCURRENCY = int(os.getenv("LLM_AGENT_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_SHED_POLICY = os.getenv("LLM_SHED_POLICY", "reply").strip().lower()
+LLM_BUSY_REPLY = "Invoke is busy right now. Try again in a minute."
+
+# Stream completions and stop as soon as the reply fills the SMS budget
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").strip().lower() in ("1", "true", "yes")
+SMS_REPLY_BUDGET = 600
+SENTENCE_ENDINGS = (". ", "! ", "? ", "\n")
+
+# Segment-aware replies: one emoji or curly quote switches a reply from GSM-7
+# to UCS-2 and roughly triples the billed segments. Transliterate back to
+# GSM-7 where possible and cap replies at a segment count (600 GSM-7 chars = 4).
+SMS_TRANSLITERATE = os.getenv("SMS_TRANSLITERATE", "true").strip().lower() in ("1", "true", "yes")
+SMS_GSM7_ONLY = os.getenv("SMS_GSM7_ONLY", "false").strip().lower() in ("1", "true", "yes")
+SMS_MAX_SEGMENTS = int(os.getenv("SMS_MAX_SEGMENTS", "4"))
+SMS_SPLIT_MESSAGES = os.getenv("SMS_SPLIT_MESSAGES", "false").strip().lower() in ("1", "true", "yes")
+
+# Deferred-reply mode: ack Twilio with empty TwiML right away and deliver the
+# LLM answer from a background worker through the Twilio REST API
+SMS_REPLY_MODE = os.getenv("SMS_REPLY_MODE", "inline").strip().lower()
+SMS_REPLY_WORKERS = int(os.getenv("SMS_REPLY_WORKERS", "4"))
+SMS_REPLY_QUEUE_SIZE = int(os.getenv("SMS_REPLY_QUEUE_SIZE", "1000"))
+SMS_SENDER = os.getenv("SMS_SENDER", "twilio").strip().lower()
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+
+# Twilio retries a slow webhook with the same MessageSid; remember results so a
+# retry reuses the first (or in-flight) computation instead of calling the LLM again
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
 
-# Parse allowlist from environment
-ALLOWED_NUMBERS_STR = os.getenv("ALLOWED_NUMBERS", "")
-ALLOWED_NUMBERS = set(num.strip() for num in ALLOWED_NUMBERS_STR.split(",") if num.strip())
+# Delivery tracking: Twilio status callbacks posted to /sms/status are joined to
+# replies by SID. SMS_STATUS_CALLBACK_URL is the public URL of /sms/status.
+SMS_STATUS_CALLBACK_URL = os.getenv("SMS_STATUS_CALLBACK_URL", "")
+DELIVERY_TRACKING_TTL_SECONDS = float(os.getenv("DELIVERY_TRACKING_TTL_SECONDS", "3600"))
 
-# Load agent registry relative to script location
+# Reply cache for repeated prompts (set REPLY_CACHE_MAX_ENTRIES=0 to disable)
+REPLY_CACHE_TTL_SECONDS = float(os.getenv("REPLY_CACHE_TTL_SECONDS", "300"))
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "512"))
+
+# Per-number conversation memory: recent turns are replayed to the model within
+# each agent's token budget ("history_tokens" in agents.json overrides the default)
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "6"))
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "400"))
+CONVERSATION_MAX_TOTAL_TOKENS = int(os.getenv("CONVERSATION_MAX_TOTAL_TOKENS", "1000000"))
+
+# Agent registry (relative to script location) and allowlist, compiled into one
+# routing table. A watcher swaps in a new table when agents.json or .env changes.
 AGENTS_PATH = Path(__file__).with_name("agents.json")
-with AGENTS_PATH.open("r", encoding="utf-8") as f:
-    AGENTS_DATA = json.load(f)
-    AGENT_NAMES = {agent["name"].lower() for agent in AGENTS_DATA["agents"]}
-    AGENT_CONFIGS = {agent["name"].lower(): agent for agent in AGENTS_DATA["agents"]}
+DOTENV_PATH = Path(__file__).with_name(".env")
+REGISTRY_RELOAD_SECONDS = float(os.getenv("REGISTRY_RELOAD_SECONDS", "2"))
+SMS_CONSTRAINT = " Respond in <= 600 characters. Be direct. No markdown."
+registry_watcher = RegistryWatcher(
+    AGENTS_PATH,
+    prompt_suffix=SMS_CONSTRAINT,
+    dotenv_path=None if ALLOWED_NUMBERS_FROM_ENVIRONMENT else DOTENV_PATH,
+    allowed_numbers=os.getenv("ALLOWED_NUMBERS", ""),
+)
+routing = registry_watcher.load()
+
+# In-memory event store: fixed-capacity deque with sequence numbers and
+# secondary indexes so /debug/events can serve cursor-based deltas
+MAX_EVENTS = int(os.getenv("MAX_EVENTS", "10000"))
+DEBUG_EVENTS_DEFAULT_LIMIT = 50
+
+
+class EventStore:
+    """Bounded event log indexed by sequence number, phone number and agent."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.events = deque()
+        self.by_from = {}
+        self.by_agent = {}
+        self.last_seq = 0
+
+    def append(self, event):
+        self.last_seq += 1
+        event["seq"] = self.last_seq
+        self.events.append(event)
+        self.by_from.setdefault(event["from"], deque()).append(event)
+        self.by_agent.setdefault(event["agent"], deque()).append(event)
+        if len(self.events) > self.capacity:
+            self._evict(self.events.popleft())
+        return event
+
+    def _evict(self, event):
+        # The evicted event is always the oldest entry in its index buckets too
+        for index, key in ((self.by_from, event["from"]), (self.by_agent, event["agent"])):
+            bucket = index.get(key)
+            if bucket:
+                bucket.popleft()
+                if not bucket:
+                    del index[key]
+
+    def __len__(self):
+        return len(self.events)
+
+    def query(self, since=None, limit=DEBUG_EVENTS_DEFAULT_LIMIT, from_number=None, agent=None):
+        """
+        Return matching events, most recent first.
+        With `since`, returns the oldest `limit` events after that cursor so a
+        client paging forward never skips any; without it, the newest `limit`.
+        """
+        source = self.events
+        if from_number is not None:
+            source = self.by_from.get(from_number, ())
+        if agent is not None:
+            agent_bucket = self.by_agent.get(agent, ())
+            if from_number is None or len(agent_bucket) < len(source):
+                source = agent_bucket
+
+        # Walk back from the newest entry until the cursor is reached
+        matched = []
+        for event in reversed(source):
+            if since is not None and event["seq"] <= since:
+                break
+            if from_number is not None and event["from"] != from_number:
+                continue
+            if agent is not None and event["agent"] != agent:
+                continue
+            matched.append(event)
+            if since is None and len(matched) >= limit:
+                break
+        if since is not None and len(matched) > limit:
+            matched = matched[-limit:]
+        return matched
+
+
+# Shared state for multi-worker deployments (uvicorn --workers N): events and
+# counters live in one SQLite file so every worker serves the same timeline
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")
+SHARED_STATE_POLL_SECONDS = float(os.getenv("SHARED_STATE_POLL_SECONDS", "0.25"))
+SHARED_COUNTER_FLUSH_SECONDS = 1.0
+
+if SHARED_STATE_PATH:
+    event_store = SharedEventStore(SHARED_STATE_PATH, MAX_EVENTS)
+else:
+    event_store = EventStore(MAX_EVENTS)
+counter_sync = CounterSync()
+
+# Optional durable journal (SQLite, WAL mode) so history survives restarts
+EVENT_JOURNAL_PATH = os.getenv("EVENT_JOURNAL_PATH", "")
+EVENT_JOURNAL_BATCH_SIZE = int(os.getenv("EVENT_JOURNAL_BATCH_SIZE", "200"))
+EVENT_JOURNAL_FLUSH_SECONDS = float(os.getenv("EVENT_JOURNAL_FLUSH_SECONDS", "1.0"))
+event_journal = EventJournal(
+    EVENT_JOURNAL_PATH,
+    batch_size=EVENT_JOURNAL_BATCH_SIZE,
+    flush_interval=EVENT_JOURNAL_FLUSH_SECONDS,
+) if EVENT_JOURNAL_PATH else None
+if event_journal is not None:
+    # Continue numbering after the journal so seq stays unique across restarts
+    event_store.last_seq = event_journal.max_seq()
+    if SHARED_STATE_PATH:
+        # Shared seq numbers are assigned on the store's writer thread, which passes written events on
+        event_store.on_written = event_journal.append
+
+# Optional write-behind persistence into the Supabase messages/events tables
+# (postgresql:// DSN) or a local SQLite file with the same schema (any other value)
+PERSISTENCE_DSN = os.getenv("PERSISTENCE_DSN", "")
+PERSISTENCE_BATCH_SIZE = int(os.getenv("PERSISTENCE_BATCH_SIZE", "100"))
+PERSISTENCE_FLUSH_SECONDS = float(os.getenv("PERSISTENCE_FLUSH_SECONDS", "1.0"))
+PERSISTENCE_POOL_SIZE = int(os.getenv("PERSISTENCE_POOL_SIZE", "2"))
+persister = WriteBehindPersister(
+    build_sink(PERSISTENCE_DSN, PERSISTENCE_POOL_SIZE),
+    batch_size=PERSISTENCE_BATCH_SIZE,
+    flush_interval=PERSISTENCE_FLUSH_SECONDS,
+) if PERSISTENCE_DSN else None
+
+# Intake flow (port of lib/invoke.ts) for non-// texts from allowed numbers. States
+# are cached per phone and written behind to `conversations` when persistence is on.
+SMS_INTAKE = os.getenv("SMS_INTAKE", "true").strip().lower() in ("1", "true", "yes")
+INTAKE_CACHE_MAX_ENTRIES = int(os.getenv("INTAKE_CACHE_MAX_ENTRIES", "10000"))
+intake_states = IntakeStateCache(INTAKE_CACHE_MAX_ENTRIES, persister)
+
+# Event-loop watchdog: logs a stack sample when the loop stalls past the lag
+# threshold or a request runs past the slow-request threshold (0 disables each)
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "5000"))
+loop_watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD_MS, SLOW_REQUEST_MS)
+
+# Server-Sent Events fan-out for the /ui debug console
+SSE_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_SUBSCRIBER_QUEUE_SIZE", "256"))
+SSE_HEARTBEAT_SECONDS = 15
 
-# In-memory event ring buffer (max 50 events)
-MAX_EVENTS = 50
-events = []
 
-def log_event(from_number, authorized, raw_body, triggered, agent, prompt, reply_text, error):
-    """Log an event to the ring buffer."""
+class EventBroadcaster:
+    """Push new events to every subscriber through its own bounded queue."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.dropped = 0
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            # A slow subscriber loses its oldest pending events instead of
+            # growing without bound or stalling the request path
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+
+event_broadcaster = EventBroadcaster(SSE_SUBSCRIBER_QUEUE_SIZE)
+
+
+def log_event(from_number, authorized, raw_body, triggered, agent, prompt, reply_text, error, **extra):
+    """Log an event to the event store. Extra keyword fields are stored on the event as-is."""
     event = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "from": from_number,
@@ -42,35 +286,812 @@ def log_event(from_number, authorized, raw_body, triggered, agent, prompt, reply
         "reply_text": reply_text,
         "error": error
     }
-    events.append(event)
-    # Trim to max size (ring buffer)
-    while len(events) > MAX_EVENTS:
-        events.pop(0)
+    if reply_text:
+        event["encoding"] = detect_encoding(reply_text)
+        event["segments"] = sum(count_segments(part) for part in reply_parts(reply_text))
+    event.update(extra)
+    observe_event(event)
+    event_store.append(event)
+    # With shared state the tail task publishes events from every worker in seq order
+    if not SHARED_STATE_PATH:
+        event_broadcaster.publish(event)
+    if event_journal is not None and not SHARED_STATE_PATH:
+        event_journal.append(event)
+    if persister is not None:
+        persister.append(event)
+    return event
+
+
+class ReplyCache:
+    """Bounded TTL + LRU cache of LLM replies keyed by (agent, model, normalized prompt)."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(agent_name, model, prompt):
+        normalized = " ".join(prompt.casefold().split())
+        return (agent_name, model, normalized)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, reply_text = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return reply_text
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, reply_text):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, reply_text)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+reply_cache = ReplyCache(REPLY_CACHE_MAX_ENTRIES, REPLY_CACHE_TTL_SECONDS)
+conversation_store = ConversationStore(CONVERSATION_MAX_TURNS, CONVERSATION_MAX_TOTAL_TOKENS)
+
+
+class IdempotencyTable:
+    """Bounded, TTL-evicted map of MessageSid -> task producing that message's TwiML."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.duplicates = 0
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.entries:
+            key, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[key]
+
+    async def run(self, key, factory):
+        """
+        Return (result, duplicate) for key, computing the result with factory() only once
+        per TTL window; duplicate is True when this call reused an earlier computation.
+        """
+        self._evict()
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.duplicates += 1
+            # Shield so a retry that disconnects cannot cancel the shared computation
+            return await asyncio.shield(entry[1]), True
+        task = asyncio.ensure_future(factory())
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, task)
+        task.add_done_callback(lambda done: self._forget_failed(key, done))
+        return await asyncio.shield(task), False
+
+    def _forget_failed(self, key, task):
+        # Failed computations are not remembered, so Twilio's retry can try again
+        if task.cancelled() or task.exception() is not None:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is task:
+                del self.entries[key]
+
+    def stats(self):
+        return {"size": len(self.entries), "duplicates": self.duplicates}
+
+
+idempotency_table = IdempotencyTable(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
+delivery_tracker = DeliveryTracker(ttl_seconds=DELIVERY_TRACKING_TTL_SECONDS)
+
+
+def local_counters():
+    """Process-local counter totals that are summed across workers in shared mode."""
+    return {
+        "reply_cache.hits": reply_cache.hits,
+        "reply_cache.misses": reply_cache.misses,
+        "reply_cache.evictions": reply_cache.evictions,
+        "sse.dropped": event_broadcaster.dropped,
+    }
+
+
+def flush_shared_counters():
+    """Push this worker's counter deltas to the shared store."""
+    event_store.add_counters(counter_sync.deltas(local_counters()))
+
+
+def reply_cache_stats():
+    """Reply cache stats; hit/miss/eviction counts are summed over all workers in shared mode."""
+    stats = reply_cache.stats()
+    if SHARED_STATE_PATH:
+        flush_shared_counters()
+        shared = event_store.counters()
+        stats["hits"] = shared.get("reply_cache.hits", 0)
+        stats["misses"] = shared.get("reply_cache.misses", 0)
+        stats["evictions"] = shared.get("reply_cache.evictions", 0)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+async def read_event_store(func, *args, **kwargs):
+    """Call an event store read; shared-state reads hit SQLite, so they run off the event loop."""
+    if SHARED_STATE_PATH:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def tail_shared_events():
+    """Publish events written by any worker to this worker's SSE subscribers, in seq order."""
+    published_seq = await asyncio.to_thread(lambda: event_store.last_seq)
+    last_counter_flush = time.monotonic()
+    while True:
+        try:
+            new_events = await asyncio.to_thread(event_store.query, published_seq, 1000)
+            for event in reversed(new_events):
+                event_broadcaster.publish(event)
+                published_seq = event["seq"]
+            if time.monotonic() - last_counter_flush >= SHARED_COUNTER_FLUSH_SECONDS:
+                await asyncio.to_thread(flush_shared_counters)
+                last_counter_flush = time.monotonic()
+        except Exception as e:
+            print(f"[⚠️ Shared State Error]: {e}")
+        await asyncio.sleep(SHARED_STATE_POLL_SECONDS)
+
+
+async def watch_registry():
+    """Poll agents.json and .env; swap in a freshly compiled routing table when they change."""
+    global routing
+    while True:
+        await asyncio.sleep(REGISTRY_RELOAD_SECONDS)
+        try:
+            table = await asyncio.to_thread(registry_watcher.check, routing)
+        except Exception as e:
+            print(f"[⚠️ Agent Registry Error]: {e}")
+            continue
+        if table is not None:
+            routing = table
+            # Cached replies may have been generated with an old system prompt
+            reply_cache.clear()
+            print(f"[Agent Registry] Loaded version {table.version}: "
+                  f"{len(table.agent_names)} agents, {len(table.allowed_numbers)} allowed numbers")
+
+
+class LLMOverloaded(Exception):
+    """Raised when a request would exceed a limiter's wait queue and should be shed."""
+
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue and queue-depth / wait-time accounting."""
+
+    def __init__(self, name, limit, max_waiting):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    @asynccontextmanager
+    async def slot(self, allow_shed=True):
+        """Hold one slot for the duration of the block; yields the time spent waiting (ms)."""
+        if allow_shed and self.in_flight >= self.limit and self.waiting >= self.max_waiting:
+            self.shed += 1
+            raise LLMOverloaded(self.name)
+        self.waiting += 1
+        wait_started = time.perf_counter()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait_ms = (time.perf_counter() - wait_started) * 1000
+        self.admitted += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.in_flight += 1
+        try:
+            yield wait_ms
+        finally:
+            self.release()
+
+    async def try_acquire(self):
+        """Take a slot only if one is free right now; returns False instead of waiting."""
+        if self.semaphore.locked():
+            return False
+        # A free semaphore is acquired without suspending
+        await self.semaphore.acquire()
+        self.admitted += 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+
+global_limiter = ConcurrencyLimiter("global", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+agent_limiters = {}
+
+# Prometheus-style metrics served at /metrics (per process)
+metrics = Registry()
+sms_requests_total = metrics.counter(
+    "sms_requests_total", "SMS webhook requests by outcome and agent.", ("outcome", "agent"))
+sms_duplicate_requests_total = metrics.counter(
+    "sms_duplicate_requests_total", "Twilio retries answered from the MessageSid idempotency table.")
+sms_request_seconds = metrics.histogram(
+    "sms_request_seconds", "End-to-end /sms handling time.", ("agent",))
+sms_llm_seconds = metrics.histogram(
+    "sms_llm_seconds", "LLM completion time.", ("agent",))
+sms_twiml_render_seconds = metrics.histogram(
+    "sms_twiml_render_seconds", "TwiML rendering time.", ("agent",))
+sms_tokens_in_total = metrics.counter(
+    "sms_tokens_in_total", "Prompt tokens sent to the LLM.", ("agent",))
+sms_tokens_out_total = metrics.counter(
+    "sms_tokens_out_total", "Completion tokens received from the LLM.", ("agent",))
+sms_segments_total = metrics.counter(
+    "sms_segments_total", "Billed SMS segments sent in replies.", ("agent", "encoding"))
+sms_delivery_seconds = metrics.histogram(
+    "sms_delivery_seconds", "Time from receiving an SMS to Twilio reporting its reply delivered.", ("agent",),
+    buckets=(0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300))
+sms_delivery_status_total = metrics.counter(
+    "sms_delivery_status_total", "Twilio status callbacks matched to replies.", ("agent", "status"))
+sms_requests_in_flight = metrics.gauge(
+    "sms_requests_in_flight", "/sms requests currently being handled.")
+metrics.gauge(
+    "sms_llm_in_flight", "LLM requests currently holding a concurrency slot.",
+    callback=lambda: {(): global_limiter.in_flight})
+metrics.gauge(
+    "sms_event_loop_lag_seconds", "Event-loop lag measured at the last watchdog tick.",
+    callback=lambda: {(): loop_watchdog.current_lag_ms / 1000})
+metrics.gauge(
+    "sms_llm_queue_depth", "LLM requests waiting for a concurrency slot.",
+    callback=lambda: {(): global_limiter.waiting})
+
+
+def observe_event(event):
+    """Count a logged event by outcome and record its LLM latency and token usage."""
+    agent = event["agent"] or "none"
+    if not event["authorized"]:
+        outcome = "unauthorized"
+    elif not event["triggered"]:
+        outcome = "intake" if event.get("intake_step") else "not_triggered"
+    elif not event["agent"]:
+        outcome = "help"
+    elif event["error"]:
+        outcome = "error"
+    else:
+        outcome = "routed"
+    sms_requests_total.inc((outcome, agent))
+    if "llm_ms" in event:
+        sms_llm_seconds.observe((agent,), event["llm_ms"] / 1000)
+    if event.get("tokens_in"):
+        sms_tokens_in_total.inc((agent,), event["tokens_in"])
+    if event.get("tokens_out"):
+        sms_tokens_out_total.inc((agent,), event["tokens_out"])
+    if event.get("segments"):
+        sms_segments_total.inc((agent, event["encoding"]), event["segments"])
+
+
+def render_twiml(response, agent_name, started):
+    """Render TwiML, recording render time and end-to-end request time."""
+    render_started = time.perf_counter()
+    twiml = str(response)
+    finished = time.perf_counter()
+    agent = agent_name or "none"
+    sms_twiml_render_seconds.observe((agent,), finished - render_started)
+    sms_request_seconds.observe((agent,), finished - started)
+    return twiml
+
+
+def get_agent_limiter(agent_name, agent_config):
+    """Per-agent limiter; `max_concurrency` in agents.json overrides the default."""
+    limiter = agent_limiters.get(agent_name)
+    limit = agent_config.get("max_concurrency", LLM_AGENT_MAX_CONCURRENCY)
+    # A reloaded registry can change the limit; holders of the old limiter finish on it
+    if limiter is None or limiter.limit != limit:
+        limiter = ConcurrencyLimiter(agent_name, limit, LLM_MAX_QUEUE)
+        agent_limiters[agent_name] = limiter
+    return limiter
+
+
+def trim_to_budget(text, budget=SMS_REPLY_BUDGET):
+    """Trim text to the SMS budget, cutting at a sentence boundary, else a word boundary."""
+    text = text.strip()
+    if len(text) <= budget:
+        return text
+    # Look one char past the budget so a sentence ending exactly at the limit counts
+    window = text[:budget + 1]
+    cut = max(window.rfind(ending) for ending in SENTENCE_ENDINGS)
+    if cut >= budget // 2:
+        return window[:cut + 1].strip()
+    space = window.rfind(" ")
+    if space >= budget // 2:
+        return window[:space].rstrip()
+    return text[:budget]
+
+
+def fit_to_segments(text):
+    """Transliterate toward GSM-7 and trim so the reply fits SMS_MAX_SEGMENTS billed segments."""
+    if SMS_TRANSLITERATE or SMS_GSM7_ONLY:
+        text = transliterate(text, strip_unsupported=SMS_GSM7_ONLY).strip()
+    if SMS_MAX_SEGMENTS > 0 and count_segments(text) > SMS_MAX_SEGMENTS:
+        encoding = detect_encoding(text)
+        budget = prefix_length(text, max_units(encoding, SMS_MAX_SEGMENTS), encoding)
+        text = trim_to_budget(text, budget)
+    return text
+
+
+@lru_cache(maxsize=64)
+def fit_static_reply(text):
+    """fit_to_segments for template replies, computed once per template."""
+    return fit_to_segments(text)
+
+
+def reply_parts(text):
+    """Messages a reply is delivered as: one concatenated SMS, or one per segment with SMS_SPLIT_MESSAGES."""
+    return split_segments(text) if SMS_SPLIT_MESSAGES else [text]
+
+
+def status_callback_url(inbound_sid):
+    """Status callback URL for a reply, tagged with the inbound MessageSid it answers."""
+    if not SMS_STATUS_CALLBACK_URL or not inbound_sid:
+        return SMS_STATUS_CALLBACK_URL or None
+    separator = "&" if "?" in SMS_STATUS_CALLBACK_URL else "?"
+    return f"{SMS_STATUS_CALLBACK_URL}{separator}inbound={inbound_sid}"
+
+
+def add_reply(response, reply_text, message_sid):
+    """Add a reply to the TwiML response, asking Twilio for status callbacks when configured."""
+    action = status_callback_url(message_sid)
+    for part in reply_parts(reply_text):
+        if action:
+            response.message(part, action=action, method="POST")
+        else:
+            response.message(part)
+
+
+async def create_completion(model, messages, max_tokens=150, temperature=0.7):
+    """
+    Run one chat completion.
+    Returns (text, stats). In streaming mode the stream is closed as soon as the
+    text runs past the SMS budget, so we stop paying for tokens we would trim.
+    """
+    stats = {"streamed": LLM_STREAMING}
+    started = time.perf_counter()
+    usage = None
+    if not LLM_STREAMING:
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+        text = completion.choices[0].message.content or ""
+        usage = completion.usage
+    else:
+        parts = []
+        stopped_early = False
+
+        async def read_stream():
+            nonlocal usage, stopped_early
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=LLM_TIMEOUT_SECONDS,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            length = 0
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not parts:
+                        stats["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(delta)
+                    length += len(delta)
+                    if length > SMS_REPLY_BUDGET:
+                        stopped_early = True
+                        break
+            finally:
+                await stream.close()
+
+        # The client's timeout only bounds each read; a slow trickle of chunks could
+        # otherwise hold the request open indefinitely
+        try:
+            await asyncio.wait_for(read_stream(), LLM_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"LLM stream did not finish within {LLM_TIMEOUT_SECONDS:g}s") from None
+        text = "".join(parts)
+        stats["stream_stopped_early"] = stopped_early
+    stats["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if usage is not None:
+        stats["tokens_in"] = usage.prompt_tokens
+        stats["tokens_out"] = usage.completion_tokens
+    return text, stats
+
+
+async def acquire_spare_slots(limiters):
+    """Take a free slot in every limiter without waiting; returns the limiters taken, or None."""
+    taken = []
+    for limiter in limiters:
+        if not await limiter.try_acquire():
+            for held in taken:
+                held.release()
+            return None
+        taken.append(limiter)
+    return taken
+
+
+async def create_hedged_completion(models, messages, latency_budget_ms, limiters=()):
+    """
+    Race the primary model against ordered fallbacks. A fallback is fired when
+    the in-flight requests have not answered within the latency budget, or right
+    away if they all failed. The first successful answer wins; the rest are
+    cancelled. Returns (text, stats) with which model won and by how much.
+
+    The caller's limiter slots cover one request. A hedge fired alongside it takes its
+    own slot in each of `limiters` and is skipped (and retried after another budget)
+    when any of them is full, so hedging never exceeds the concurrency limits.
+    """
+    budget = latency_budget_ms / 1000
+    remaining = list(models)
+    started = {}
+    tasks = {}
+    base_task = None  # the request running on the caller's slots
+    hedges_skipped = 0
+    last_error = None
+    loop_start = time.perf_counter()
+
+    async def launch():
+        nonlocal base_task
+        extra_slots = None
+        if base_task is not None:
+            extra_slots = await acquire_spare_slots(limiters)
+            if extra_slots is None:
+                return False
+        model = remaining.pop(0)
+        task = asyncio.create_task(create_completion(model, messages))
+        if extra_slots is None:
+            base_task = task
+        else:
+            # Held until the request really finishes, including after a cancel
+            def release_extra_slots(_task):
+                for limiter in extra_slots:
+                    limiter.release()
+            task.add_done_callback(release_extra_slots)
+        tasks[task] = model
+        started[model] = time.perf_counter()
+        return True
+
+    await launch()
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks.keys(),
+                timeout=budget if remaining else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                # Budget exceeded: hedge with the next fallback if there is a free slot
+                if not await launch():
+                    hedges_skipped += 1
+                continue
+            for task in done:
+                model = tasks.pop(task)
+                if task is base_task:
+                    base_task = None
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    continue
+                text, stats = task.result()
+                now = time.perf_counter()
+                stats["model"] = model
+                stats["hedged"] = len(started) > 1
+                if hedges_skipped:
+                    stats["hedges_skipped"] = hedges_skipped
+                if stats["hedged"]:
+                    stats["models_fired"] = list(started)
+                    stats["winner_ms"] = round((now - started[model]) * 1000, 1)
+                    primary = models[0]
+                    if primary in tasks.values():
+                        # Primary still in flight: lower bound on how much faster the winner was
+                        stats["won_by_ms"] = round(((now - started[primary]) - (now - started[model])) * 1000, 1)
+                    stats["total_ms"] = round((now - loop_start) * 1000, 1)
+                return text, stats
+            if not tasks and remaining:
+                # Everything in flight failed; the next fallback reuses the caller's slots
+                await launch()
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def generate_reply(agent_name, prompt, allow_shed=True, from_number=None):
+    """
+    Generate the SMS reply for a routed prompt, with the sender's recent turns as context.
+    Returns (reply_text, error_text, meta) where meta holds extra event fields.
+    Raises LLMOverloaded when allow_shed is set and the wait queue is full.
+    """
+    # Check if OpenAI client is configured
+    if client is None:
+        return "Invoke not configured: OPENAI_API_KEY missing.", "", {}
+
+    meta = {}
+    table = routing
+    try:
+        agent_config = table.agent_config(agent_name)
+        model = agent_config.get("model", "gpt-4o-mini")
+
+        # Replay recent turns with this agent, as many as fit its history budget
+        history = []
+        if from_number:
+            token_budget = agent_config.get("history_tokens", CONVERSATION_HISTORY_TOKENS)
+            history = conversation_store.history(from_number, agent_name, token_budget)
+        meta["history_turns"] = len(history)
+
+        # Serve repeated prompts from the reply cache unless the agent opts out.
+        # Replies that depend on earlier turns never go through the cache.
+        cache_key = None
+        if not history and agent_config.get("cache", True) and reply_cache.max_entries > 0:
+            cache_key = ReplyCache.make_key(agent_name, model, prompt)
+            cached = reply_cache.get(cache_key)
+            if cached is not None:
+                if from_number:
+                    conversation_store.record(from_number, agent_name, prompt, cached)
+                return cached, "", {"cache": "hit", "history_turns": 0}
+            meta["cache"] = "miss"
+        else:
+            meta["cache"] = "bypass"
+
+        # System prompts come precomputed with the SMS formatting constraint
+        messages = [{"role": "system", "content": table.system_prompt(agent_name)}]
+        for past_prompt, past_reply in history:
+            messages.append({"role": "user", "content": past_prompt})
+            messages.append({"role": "assistant", "content": past_reply})
+        messages.append({"role": "user", "content": prompt})
+        fallback_models = agent_config.get("fallback_models") or []
+        agent_limiter = get_agent_limiter(agent_name, agent_config)
+        async with agent_limiter.slot(allow_shed) as agent_wait_ms:
+            async with global_limiter.slot(allow_shed) as global_wait_ms:
+                meta["queue_wait_ms"] = round(agent_wait_ms + global_wait_ms, 1)
+                if fallback_models:
+                    latency_budget_ms = agent_config.get("latency_budget_ms", 3000)
+                    raw_text, stats = await create_hedged_completion(
+                        [model] + fallback_models, messages, latency_budget_ms,
+                        limiters=(agent_limiter, global_limiter),
+                    )
+                else:
+                    raw_text, stats = await create_completion(model, messages)
+        meta["model"] = model
+        meta.update(stats)
+        # Trim to prevent SMS overrun and fit the segment cap; record what was generated but thrown away
+        reply_text = fit_to_segments(trim_to_budget(raw_text))
+        discarded_chars = max(0, len(raw_text.strip()) - len(reply_text))
+        meta["discarded_chars"] = discarded_chars
+        meta["wasted_tokens_est"] = round(discarded_chars / 4)
+        if cache_key is not None and reply_text:
+            reply_cache.put(cache_key, reply_text)
+        if from_number and reply_text:
+            conversation_store.record(from_number, agent_name, prompt, reply_text)
+        return reply_text, "", meta
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        return "Invoke error. Try again.", str(e), meta
+
+
+class TwilioSender:
+    """Deliver outbound SMS through the Twilio REST API."""
+
+    def __init__(self, account_sid, auth_token, from_number):
+        from twilio.rest import Client as TwilioClient
+        self.client = TwilioClient(account_sid, auth_token)
+        self.from_number = from_number
+
+    async def send(self, to_number, body, status_callback=None):
+        params = {"to": to_number, "from_": self.from_number, "body": body}
+        if status_callback:
+            params["status_callback"] = status_callback
+        # The Twilio helper library is synchronous; keep it off the event loop
+        message = await asyncio.to_thread(self.client.messages.create, **params)
+        return message.sid
+
+
+class LocalSender:
+    """Stand-in sender that records outbound messages in memory (local runs and tests)."""
+
+    def __init__(self):
+        self.outbox = []
+
+    async def send(self, to_number, body, status_callback=None):
+        sid = f"LOCAL{len(self.outbox) + 1:06d}"
+        self.outbox.append({"sid": sid, "to": to_number, "body": body})
+        return sid
+
+
+def build_sender():
+    """
+    Pick the outbound sender from SMS_SENDER. LocalSender is only used when asked for
+    explicitly; out-of-band delivery without Twilio credentials fails at startup rather
+    than acking Twilio and dropping every reply into an in-memory outbox.
+    """
+    if SMS_SENDER == "local":
+        return LocalSender()
+    if SMS_SENDER != "twilio":
+        raise RuntimeError(f"SMS_SENDER must be 'twilio' or 'local', got {SMS_SENDER!r}")
+    if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER:
+        return TwilioSender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER)
+    if SMS_REPLY_MODE == "deferred" or LLM_SHED_POLICY == "defer":
+        missing = [name for name, value in (("TWILIO_ACCOUNT_SID", TWILIO_ACCOUNT_SID),
+                                            ("TWILIO_AUTH_TOKEN", TWILIO_AUTH_TOKEN),
+                                            ("TWILIO_PHONE_NUMBER", TWILIO_PHONE_NUMBER)) if not value]
+        raise RuntimeError(
+            f"Deferred replies need {', '.join(missing)} with SMS_SENDER=twilio "
+            "(set SMS_SENDER=local to record replies in memory instead)"
+        )
+    # Inline replies go back in the TwiML response; nothing is sent out of band
+    return None
+
+
+sender = build_sender()
+reply_queue = asyncio.Queue(maxsize=SMS_REPLY_QUEUE_SIZE)
+reply_workers = []
+background_tasks = []
+
+
+async def reply_worker():
+    """Drain deferred reply jobs: generate the answer and send it out of band."""
+    while True:
+        from_number, raw_body, agent_name, prompt, message_sid, received_at = await reply_queue.get()
+        try:
+            # Deferred jobs are already queued, so they wait for a slot instead of being shed
+            reply_text, error_text, meta = await generate_reply(
+                agent_name, prompt, allow_shed=False, from_number=from_number)
+            outbound_sids = []
+            try:
+                for part in reply_parts(reply_text):
+                    outbound_sids.append(await sender.send(from_number, part, status_callback_url(message_sid)))
+            except Exception as e:
+                error_text = error_text or f"send failed: {e}"
+            if len(outbound_sids) > 1:
+                meta["outbound_sids"] = outbound_sids
+            outbound_sid = outbound_sids[0] if outbound_sids else ""
+            log_event(from_number, True, raw_body, True, agent_name, prompt, reply_text, error_text,
+                      delivery="deferred", message_sid=message_sid, outbound_sid=outbound_sid, **meta)
+            delivery_tracker.track(agent_name, received_at, [message_sid] + outbound_sids)
+        except Exception as e:
+            print(f"[⚠️ Reply Worker Error]: {e}")
+        finally:
+            reply_queue.task_done()
+
 
 app = FastAPI()
+app.add_middleware(WatchdogMiddleware, watchdog=loop_watchdog, exclude_paths=("/debug/stream",))
 
 
-@app.post("/sms")
-async def sms_webhook(From: str = Form(...), Body: str = Form(...)):
-    """Handle incoming SMS messages with authorization and agent routing."""
+@app.on_event("startup")
+async def start_background_tasks():
+    """
+    Start the loop watchdog, journal flusher, shared-state writer and tail, registry watcher and
+    (in deferred mode, or when shed requests are deferred) the reply workers.
+    """
+    loop_watchdog.start()
+    if event_journal is not None:
+        event_journal.start()
+    if persister is not None:
+        persister.start()
+    if SHARED_STATE_PATH:
+        event_store.start()
+        background_tasks.append(asyncio.create_task(tail_shared_events()))
+    if REGISTRY_RELOAD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(watch_registry()))
+    # LLM_SHED_POLICY=defer needs the workers in inline mode too, to take shed requests
+    if SMS_REPLY_MODE == "deferred" or LLM_SHED_POLICY == "defer":
+        for _ in range(SMS_REPLY_WORKERS):
+            reply_workers.append(asyncio.create_task(reply_worker()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Stop background tasks, flush pending state and release pooled LLM connections."""
+    for task in reply_workers + background_tasks:
+        task.cancel()
+    reply_workers.clear()
+    background_tasks.clear()
+    if SHARED_STATE_PATH:
+        await asyncio.to_thread(flush_shared_counters)
+        # Drains queued appends (and hands them to the journal) before the journal closes
+        await asyncio.to_thread(event_store.close)
+    if event_journal is not None:
+        await asyncio.to_thread(event_journal.close)
+    if persister is not None:
+        await asyncio.to_thread(persister.close)
+    if client is not None:
+        await client.close()
+    await loop_watchdog.stop()
+
+
+async def handle_sms(From, Body, MessageSid=""):
+    """Handle an incoming SMS with authorization and agent routing; returns the TwiML string."""
+    started = time.perf_counter()
+    received_at = time.time()
+    # One routing-table snapshot per request, even if a reload lands mid-request
+    table = routing
     
     # Authorization check: only allowlisted numbers can proceed
-    authorized = From in ALLOWED_NUMBERS
+    authorized = From in table.allowed_numbers
     if not authorized:
         # Log unauthorized attempt
-        log_event(From, False, Body, False, "", "", "", "")
+        log_event(From, False, Body, False, "", "", "", "", message_sid=MessageSid)
         response = MessagingResponse()
-        return Response(content=str(response), media_type="application/xml")
+        return render_twiml(response, "", started)
     
     # Check if message starts with // (case insensitive, ignore whitespace)
     stripped_body = Body.strip()
     triggered = stripped_body.lower().startswith("//")
     
     if not triggered:
-        # Non-// messages ignored (empty TwiML)
-        log_event(From, True, Body, False, "", "", "", "")
         response = MessagingResponse()
-        return Response(content=str(response), media_type="application/xml")
+        if not SMS_INTAKE:
+            # Non-// messages ignored (empty TwiML)
+            log_event(From, True, Body, False, "", "", "", "", message_sid=MessageSid)
+            return render_twiml(response, "", started)
+        # Intake flow: static template replies from the cached per-phone state, no LLM
+        reply_text, state, category = await intake_states.handle(From, Body)
+        reply_text = fit_static_reply(reply_text)
+        add_reply(response, reply_text, MessageSid)
+        log_event(From, True, Body, False, "", "", reply_text, "", message_sid=MessageSid,
+                  intake_step=state.step, intake_category=category)
+        delivery_tracker.track("", received_at, [MessageSid])
+        return render_twiml(response, "", started)
     
     # Strip // trigger and whitespace
     remainder = stripped_body[2:].strip()
@@ -78,10 +1099,11 @@ async def sms_webhook(From: str = Form(...), Body: str = Form(...)):
     # If empty after //, return help message
     if not remainder:
         help_text = "Usage: // <message> or //agent <message>"
-        log_event(From, True, Body, True, "", "", help_text, "")
+        log_event(From, True, Body, True, "", "", help_text, "", message_sid=MessageSid)
         response = MessagingResponse()
-        response.message(help_text)
-        return Response(content=str(response), media_type="application/xml")
+        add_reply(response, help_text, MessageSid)
+        delivery_tracker.track("", received_at, [MessageSid])
+        return render_twiml(response, "", started)
     
     # Split on first space only
     parts = remainder.split(" ", 1)
@@ -89,7 +1111,7 @@ async def sms_webhook(From: str = Form(...), Body: str = Form(...)):
     rest = parts[1].strip() if len(parts) > 1 else ""
     
     # If first_token matches an agent name, route to that agent
-    if first_token in AGENT_NAMES:
+    if first_token in table.agent_names:
         agent_name = first_token
         prompt = rest if rest else "Help"
     else:
@@ -97,55 +1119,198 @@ async def sms_webhook(From: str = Form(...), Body: str = Form(...)):
         agent_name = "default"
         prompt = remainder
     
-    # Generate LLM response
     response = MessagingResponse()
-    reply_text = ""
-    error_text = ""
-    
-    # Check if OpenAI client is configured
-    if client is None:
-        reply_text = "Invoke not configured: OPENAI_API_KEY missing."
-        log_event(From, True, Body, True, agent_name, prompt, reply_text, "")
-        response.message(reply_text)
-        return Response(content=str(response), media_type="application/xml")
-    
+
+    # Deferred mode: hand the job to the reply workers and ack Twilio immediately.
+    # If the queue is full, fall through and answer inline instead of dropping it.
+    if SMS_REPLY_MODE == "deferred" and reply_workers:
+        try:
+            reply_queue.put_nowait((From, Body, agent_name, prompt, MessageSid, received_at))
+            return render_twiml(response, agent_name, started)
+        except asyncio.QueueFull:
+            pass
+
+    # Generate LLM response
     try:
-        agent_config = AGENT_CONFIGS.get(agent_name, AGENT_CONFIGS.get("default"))
-        system_prompt = agent_config.get("system_prompt", "You are a helpful assistant.")
-        model = agent_config.get("model", "gpt-4o-mini")
-        
-        # Add SMS formatting constraint to system prompt
-        sms_constraint = " Respond in <= 600 characters. Be direct. No markdown."
-        
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt + sms_constraint},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
-        
-        reply_text = completion.choices[0].message.content.strip()
-        # Hard trim to prevent SMS overrun
-        reply_text = reply_text[:600]
-        response.message(reply_text)
-    except Exception as e:
-        error_text = str(e)
-        reply_text = "Invoke error. Try again."
-        response.message(reply_text)
+        reply_text, error_text, meta = await generate_reply(agent_name, prompt, from_number=From)
+    except LLMOverloaded as overloaded:
+        # Shed: hand off to the deferred workers if configured, else send a canned reply
+        if LLM_SHED_POLICY == "defer" and reply_workers:
+            try:
+                reply_queue.put_nowait((From, Body, agent_name, prompt, MessageSid, received_at))
+                return render_twiml(response, agent_name, started)
+            except asyncio.QueueFull:
+                pass
+        reply_text, error_text, meta = LLM_BUSY_REPLY, "", {"shed": "reply", "shed_by": str(overloaded)}
+    add_reply(response, reply_text, MessageSid)
     
     # Log the event
-    log_event(From, True, Body, True, agent_name, prompt, reply_text, error_text)
+    log_event(From, True, Body, True, agent_name, prompt, reply_text, error_text,
+              message_sid=MessageSid, **meta)
+    delivery_tracker.track(agent_name, received_at, [MessageSid])
     
-    return Response(content=str(response), media_type="application/xml")
+    return render_twiml(response, agent_name, started)
+
+
+@app.post("/sms")
+async def sms_webhook(From: str = Form(...), Body: str = Form(...), MessageSid: str = Form(None)):
+    """Handle incoming SMS messages; Twilio retries of the same MessageSid reuse the first result."""
+    sms_requests_in_flight.inc()
+    try:
+        if not MessageSid:
+            twiml = await handle_sms(From, Body)
+        else:
+            twiml, duplicate = await idempotency_table.run(MessageSid, lambda: handle_sms(From, Body, MessageSid))
+            if duplicate:
+                sms_duplicate_requests_total.inc()
+    finally:
+        sms_requests_in_flight.dec()
+    return Response(content=twiml, media_type="application/xml")
+
+
+@app.post("/sms/status")
+async def sms_status_callback(
+    MessageSid: str = Form(...),
+    MessageStatus: str = Form(...),
+    ErrorCode: str = Form(None),
+    inbound: str = Query(None),
+):
+    """Twilio status callback: join the status to its reply and record receive-to-deliver latency."""
+    matched = delivery_tracker.update(MessageSid, MessageStatus, inbound_sid=inbound, error_code=ErrorCode)
+    if matched is not None:
+        agent, elapsed_ms = matched
+        sms_delivery_status_total.inc((agent, MessageStatus))
+        if MessageStatus == "delivered":
+            sms_delivery_seconds.observe((agent,), elapsed_ms / 1000)
+    return Response(status_code=204)
 
 
 @app.get("/debug/events")
-async def get_debug_events():
-    """Return events as JSON (most recent first)."""
-    return JSONResponse(content={"events": list(reversed(events))})
+async def get_debug_events(
+    since: int = Query(None, ge=0),
+    limit: int = Query(DEBUG_EVENTS_DEFAULT_LIMIT, ge=1),
+    from_number: str = Query(None, alias="from"),
+    agent: str = Query(None),
+):
+    """
+    Return events as JSON (most recent first) along with reply cache counters.
+    Pass `since=<seq>` to receive only events newer than that cursor; `cursor`
+    in the response is the value to send on the next poll.
+    """
+    matched, last_seq = await read_event_store(
+        lambda: (event_store.query(since=since, limit=min(limit, MAX_EVENTS),
+                                   from_number=from_number, agent=agent), event_store.last_seq)
+    )
+    cursor = matched[0]["seq"] if matched else (since if since is not None else last_seq)
+    # Join delivery statuses from Twilio callbacks at read time (stored events are never mutated)
+    events = []
+    for event in matched:
+        delivery = delivery_tracker.lookup(event.get("message_sid"))
+        events.append(dict(event, delivery_status=delivery) if delivery else event)
+    return JSONResponse(content={
+        "events": events,
+        "cursor": cursor,
+        "last_seq": last_seq,
+        "reply_cache": await read_event_store(reply_cache_stats),
+        "delivery": delivery_tracker.stats(),
+    })
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose webhook metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/stats")
+async def get_debug_stats():
+    """Live limiter queue depth, in-flight counts and wait times, globally and per agent."""
+    return JSONResponse(content={
+        "shed_policy": LLM_SHED_POLICY,
+        "global": global_limiter.stats(),
+        "agents": {name: limiter.stats() for name, limiter in agent_limiters.items()},
+        "deferred_queue_depth": reply_queue.qsize(),
+        "idempotency": idempotency_table.stats(),
+        "registry": registry_watcher.stats(routing),
+        "conversations": conversation_store.stats(),
+        "persistence": persister.stats() if persister is not None else None,
+        "shared_state": event_store.stats() if SHARED_STATE_PATH else None,
+        "intake": intake_states.stats(),
+    })
+
+
+@app.get("/debug/loop")
+async def get_loop_diagnostics():
+    """Current event-loop lag, stalls and slow requests, with the top offenders' stack samples."""
+    return JSONResponse(content=loop_watchdog.stats())
+
+
+@app.get("/debug/journal")
+async def query_event_journal(
+    start: str = Query(None),
+    end: str = Query(None),
+    from_number: str = Query(None, alias="from"),
+    agent: str = Query(None),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    """Query the durable event journal by time range (ISO-8601 or epoch), phone and agent."""
+    if event_journal is None:
+        return JSONResponse(status_code=404, content={"error": "Event journal disabled. Set EVENT_JOURNAL_PATH."})
+    try:
+        start_ts = parse_timestamp(start)
+        end_ts = parse_timestamp(end)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid timestamp: {e}"})
+    matched = await asyncio.to_thread(
+        event_journal.query, start_ts, end_ts, from_number, agent, limit
+    )
+    return JSONResponse(content={"events": matched, "journal": event_journal.stats()})
+
+
+def format_sse(event):
+    """Encode an event as an SSE frame carrying its sequence number as the id."""
+    return f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+
+
+@app.get("/debug/stream")
+async def stream_debug_events(request: Request, since: int = Query(None, ge=0)):
+    """
+    Stream events as Server-Sent Events. On connect, replays the newest events
+    (or everything after `since` / the Last-Event-ID header), then pushes live.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    queue = event_broadcaster.subscribe()
+    backlog = await read_event_store(event_store.query, since=since)
+
+    async def event_stream():
+        try:
+            last_seq = since or 0
+            for event in reversed(backlog):
+                last_seq = event["seq"]
+                yield format_sse(event)
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Skip anything already sent as part of the replayed backlog
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                yield format_sse(event)
+        finally:
+            event_broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/ui")
@@ -309,95 +1474,105 @@ async def get_ui():
         </div>
     </div>
     <script>
-        let lastEvents = [];
+        const MAX_CARDS = 50;
+        const MAX_BUBBLES = 100;
+        let lastSeq = 0;
         
-        function renderChat(events) {
+        function clearEmptyState(container) {
+            const empty = container.querySelector('.empty-state');
+            if (empty) empty.remove();
+        }
+        
+        function appendChat(event) {
             const container = document.getElementById('chatContainer');
-            if (events.length === 0) {
-                container.innerHTML = '<div class="empty-state">No messages yet...</div>';
-                return;
-            }
+            clearEmptyState(container);
+            const stickToBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 20;
             
-            let html = '';
-            // Show events in chronological order for chat
-            const chronological = [...events].reverse();
+            // User message bubble
+            let html = `<div class="bubble bubble-user">${escapeHtml(event.raw_body)}</div>`;
             
-            chronological.forEach(event => {
-                // User message bubble
-                html += `<div class="bubble bubble-user">${escapeHtml(event.raw_body)}</div>`;
-                
-                // Assistant reply if triggered and has reply
-                if (event.triggered && event.reply_text) {
-                    html += `<div class="bubble bubble-assistant">${escapeHtml(event.reply_text)}</div>`;
-                }
-            });
+            // Assistant reply for triggered messages and intake replies
+            if ((event.triggered || event.intake_step) && event.reply_text) {
+                html += `<div class="bubble bubble-assistant">${escapeHtml(event.reply_text)}</div>`;
+            }
             
-            container.innerHTML = html;
-            container.scrollTop = container.scrollHeight;
+            container.insertAdjacentHTML('beforeend', html);
+            while (container.children.length > MAX_BUBBLES) {
+                container.firstElementChild.remove();
+            }
+            if (stickToBottom) container.scrollTop = container.scrollHeight;
         }
         
-        function renderEvents(events) {
+        function prependEvent(event) {
             const container = document.getElementById('eventsContainer');
-            if (events.length === 0) {
-                container.innerHTML = '<div class="empty-state">Waiting for events...</div>';
-                return;
-            }
+            clearEmptyState(container);
             
-            let html = '';
-            events.forEach(event => {
-                let cardClass = 'event-card';
-                if (!event.authorized) cardClass += ' unauthorized';
-                else if (!event.triggered) cardClass += ' not-triggered';
-                
-                const authBadge = event.authorized 
-                    ? '<span class="badge badge-ok">Authorized</span>' 
-                    : '<span class="badge badge-fail">Unauthorized</span>';
-                const triggerBadge = event.triggered 
-                    ? '<span class="badge badge-ok">Triggered</span>' 
+            let cardClass = 'event-card';
+            if (!event.authorized) cardClass += ' unauthorized';
+            else if (!event.triggered) cardClass += ' not-triggered';
+            
+            const authBadge = event.authorized 
+                ? '<span class="badge badge-ok">Authorized</span>' 
+                : '<span class="badge badge-fail">Unauthorized</span>';
+            const triggerBadge = event.triggered 
+                ? '<span class="badge badge-ok">Triggered</span>' 
+                : event.intake_step
+                    ? '<span class="badge badge-neutral">Intake</span>'
                     : '<span class="badge badge-neutral">Not Triggered</span>';
-                
-                html += `<div class="${cardClass}">
-                    <div class="event-header">
-                        <span>${new Date(event.timestamp).toLocaleTimeString()}</span>
-                        <span>${authBadge} ${triggerBadge}</span>
-                    </div>
-                    <div class="event-row">
-                        <div class="event-label">From:</div>
-                        <div class="event-value">${escapeHtml(event.from)}</div>
-                    </div>
-                    <div class="event-row">
-                        <div class="event-label">Raw Body:</div>
-                        <div class="event-value">${escapeHtml(event.raw_body)}</div>
-                    </div>`;
-                
-                if (event.triggered) {
-                    html += `
-                    <div class="event-row">
-                        <div class="event-label">Agent:</div>
-                        <div class="event-value">${escapeHtml(event.agent || 'default')}</div>
-                    </div>
-                    <div class="event-row">
-                        <div class="event-label">Prompt:</div>
-                        <div class="event-value">${escapeHtml(event.prompt)}</div>
-                    </div>
-                    <div class="event-row">
-                        <div class="event-label">Reply:</div>
-                        <div class="event-value">${escapeHtml(event.reply_text)}</div>
-                    </div>`;
-                }
-                
-                if (event.error) {
-                    html += `
-                    <div class="event-row">
-                        <div class="event-label">Error:</div>
-                        <div class="event-value" style="color: #ff3b30;">${escapeHtml(event.error)}</div>
-                    </div>`;
-                }
-                
-                html += '</div>';
-            });
             
-            container.innerHTML = html;
+            let html = `<div class="${cardClass}">
+                <div class="event-header">
+                    <span>${new Date(event.timestamp).toLocaleTimeString()}</span>
+                    <span>${authBadge} ${triggerBadge}</span>
+                </div>
+                <div class="event-row">
+                    <div class="event-label">From:</div>
+                    <div class="event-value">${escapeHtml(event.from)}</div>
+                </div>
+                <div class="event-row">
+                    <div class="event-label">Raw Body:</div>
+                    <div class="event-value">${escapeHtml(event.raw_body)}</div>
+                </div>`;
+            
+            if (event.triggered) {
+                html += `
+                <div class="event-row">
+                    <div class="event-label">Agent:</div>
+                    <div class="event-value">${escapeHtml(event.agent || 'default')}</div>
+                </div>
+                <div class="event-row">
+                    <div class="event-label">Prompt:</div>
+                    <div class="event-value">${escapeHtml(event.prompt)}</div>
+                </div>
+                <div class="event-row">
+                    <div class="event-label">Reply:</div>
+                    <div class="event-value">${escapeHtml(event.reply_text)}</div>
+                </div>`;
+            } else if (event.intake_step) {
+                html += `
+                <div class="event-row">
+                    <div class="event-label">Intake Step:</div>
+                    <div class="event-value">${escapeHtml(event.intake_step)}</div>
+                </div>
+                <div class="event-row">
+                    <div class="event-label">Reply:</div>
+                    <div class="event-value">${escapeHtml(event.reply_text)}</div>
+                </div>`;
+            }
+            
+            if (event.error) {
+                html += `
+                <div class="event-row">
+                    <div class="event-label">Error:</div>
+                    <div class="event-value" style="color: #ff3b30;">${escapeHtml(event.error)}</div>
+                </div>`;
+            }
+            
+            html += '</div>';
+            container.insertAdjacentHTML('afterbegin', html);
+            while (container.children.length > MAX_CARDS) {
+                container.lastElementChild.remove();
+            }
         }
         
         function escapeHtml(text) {
@@ -407,24 +1582,19 @@ async def get_ui():
             return div.innerHTML;
         }
         
-        async function pollEvents() {
-            try {
-                const response = await fetch('/debug/events');
-                const data = await response.json();
-                
-                if (JSON.stringify(data.events) !== JSON.stringify(lastEvents)) {
-                    lastEvents = data.events;
-                    renderChat(data.events);
-                    renderEvents(data.events);
-                }
-            } catch (e) {
-                console.error('Poll error:', e);
-            }
-        }
-        
-        // Initial load and polling
-        pollEvents();
-        setInterval(pollEvents, 1500);
+        // Server pushes each event once; the browser resends Last-Event-ID on
+        // reconnect so nothing is rendered twice
+        const source = new EventSource('/debug/stream');
+        source.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.seq <= lastSeq) return;
+            lastSeq = event.seq;
+            appendChat(event);
+            prependEvent(event);
+        };
+        source.onerror = (e) => {
+            console.error('Stream error:', e);
+        };
     </script>
 </body>
 </html>"""
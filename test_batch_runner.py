@@ -0,0 +1,38 @@
+import json
+
+import ai_orchestrator.__main__ as orchestrator
+from ai_orchestrator.utils import retry
+from ai_orchestrator.utils.batch_runner import run_batch
+from ai_orchestrator.utils.keyword_matcher import KeywordMatcher
+
+
+def always_raises(prompt):
+    raise RuntimeError("agent is down")
+
+
+def travel_agent(prompt):
+    return f"Booked: {prompt}"
+
+
+def test_agent_failures_are_reported_as_failed(tmp_path, monkeypatch):
+    logged = []
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(orchestrator.activity_log, "submit", lambda *args: logged.append(args))
+    monkeypatch.setattr(orchestrator, "ROUTE_MATCHER",
+                        KeywordMatcher().add("log", always_raises, 80).add("trip", travel_agent, 90))
+    monkeypatch.setattr(orchestrator, "classifier_agent", lambda prompt: "unclassified")
+
+    prompts = tmp_path / "prompts.jsonl"
+    prompts.write_text("\n".join(json.dumps(p) for p in ("log this", "plan a trip", "hello")) + "\n")
+    output = tmp_path / "results.jsonl"
+
+    summary = run_batch(orchestrator.route_prompt_with_status, str(prompts), str(output), workers=2)
+
+    results = {r["prompt"]: r for r in map(json.loads, output.read_text().splitlines())}
+    assert results["log this"]["status"] == "failed"
+    assert results["log this"]["agent"] == "always_raises"
+    assert "agent is down" in results["log this"]["response"]
+    assert results["plan a trip"]["status"] == "routed"
+    assert results["hello"]["status"] == "unrouted"
+    assert summary["statuses"] == {"failed": 1, "routed": 1, "unrouted": 1}
+    assert ("agent_activity", "always_raises", "Log", "Failed", "All attempts failed: agent is down") in logged
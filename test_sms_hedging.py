@@ -0,0 +1,69 @@
+import asyncio
+import os
+import types
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("REGISTRY_RELOAD_SECONDS", "0")
+
+import sms_webhook
+
+
+class SlowCompletions:
+    """Non-streaming stand-in for the OpenAI client that records peak concurrency."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def create(self, model, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        message = types.SimpleNamespace(content=f"reply from {model}")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+class HedgedTable:
+    def agent_config(self, agent_name):
+        return {"model": "primary", "fallback_models": ["fallback"], "latency_budget_ms": 20, "cache": False}
+
+    def system_prompt(self, agent_name):
+        return "Reply briefly."
+
+
+def run_replies(monkeypatch, limit, requests):
+    completions = SlowCompletions(delay=0.15)
+    monkeypatch.setattr(sms_webhook, "client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(sms_webhook, "LLM_STREAMING", False)
+    monkeypatch.setattr(sms_webhook, "routing", HedgedTable())
+    monkeypatch.setattr(sms_webhook, "agent_limiters", {})
+
+    async def main():
+        monkeypatch.setattr(sms_webhook, "global_limiter", sms_webhook.ConcurrencyLimiter("global", limit, 100))
+        return await asyncio.gather(*(
+            sms_webhook.generate_reply("commish", f"question {i}", allow_shed=False) for i in range(requests)
+        ))
+
+    return completions, asyncio.run(main())
+
+
+def test_hedging_stays_within_global_limit(monkeypatch):
+    completions, replies = run_replies(monkeypatch, limit=3, requests=8)
+    assert all(error == "" for _, error, _ in replies)
+    assert completions.peak <= 3
+    assert sms_webhook.global_limiter.in_flight == 0
+
+
+def test_hedge_fires_when_slots_are_free(monkeypatch):
+    completions, replies = run_replies(monkeypatch, limit=4, requests=1)
+    _, error, meta = replies[0]
+    assert error == ""
+    assert meta["hedged"] is True
+    assert completions.calls == 2
+    assert completions.peak == 2
@@ -18,20 +18,18 @@ import uvicorn
 from typing import Optional
 from pydantic import BaseModel
 import logging
+from loop_watchdog import LoopWatchdog, WatchdogMiddleware
 
 # Import from ai_orchestrator for agent routing
 try:
     print("Attempting to import from ai_orchestrator...")
-    from ai_orchestrator.agents.classifier_agent import classifier_agent
+    # Agents are registered lazily, so this does not import any agent module
     from ai_orchestrator.__main__ import route_prompt
     print("Successfully imported from ai_orchestrator")
 except Exception as e:
     print(f"ERROR importing from ai_orchestrator: {e}")
     print("This is likely the reason the server is shutting down")
     # Create placeholder functions for testing
-    def classifier_agent(prompt):
-        return "classifier_placeholder"
-    
     def route_prompt(prompt):
         return "test_agent", f"Test response for: {prompt}"
 
@@ -42,6 +40,22 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 app = FastAPI(title="AI Agent Orchestrator")
 
+# Event-loop watchdog: route_prompt runs synchronously inside the async handler,
+# so log a stack sample whenever it (or anything else) stalls the loop
+loop_watchdog = LoopWatchdog(
+    lag_threshold_ms=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")),
+    slow_request_ms=float(os.getenv("SLOW_REQUEST_MS", "5000")),
+)
+app.add_middleware(WatchdogMiddleware, watchdog=loop_watchdog)
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    loop_watchdog.start()
+
+@app.on_event("shutdown")
+async def stop_loop_watchdog():
+    await loop_watchdog.stop()
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="web_interface/static"), name="static")
 
@@ -106,6 +120,11 @@ async def get_agents():
     
     return {"agents": agents}
 
+@app.get("/debug/loop")
+async def get_loop_diagnostics():
+    """Current event-loop lag, stalls and slow requests, with the top offenders' stack samples"""
+    return loop_watchdog.stats()
+
 def start():
     """Start the web server"""
     uvicorn.run("web_interface.main:app", host="0.0.0.0", port=8000, reload=True)